@@ -0,0 +1,85 @@
+import csv
+import heapq
+from typing import Iterable, Iterator
+
+from store_processing import StoreProduct
+
+class FinalTable:
+    """
+    Итоговая таблица {код товара магазина -> название и предложения (цена, поставщик)}.
+    - Повторы (цена, поставщик) у товара отсекаются по словарю, а не поиском по списку.
+    - Если задан `top_n`, у товара остаются только `top_n` самых дешевых предложений:
+      они хранятся в куче ограниченного размера, поэтому память не зависит от числа совпадений.
+    - При равной цене раньше идет предложение, которое пришло первым (как у сортировки полного списка).
+    - Ширина таблицы (`max_suppliers`) считается по ходу добавления, поэтому строки пишутся в CSV
+      сразу, без промежуточного списка строк.
+    """
+    def __init__(self, top_n: int | None = None) -> None:
+        if top_n is not None and top_n < 1:
+            raise ValueError("top_n должен быть положительным")
+        self.top_n = top_n
+        # код -> (название, {(цена, поставщик) -> порядковый номер}, куча (-цена, -номер, поставщик) или None)
+        self.entries: dict[str, tuple[str, dict[tuple[int, str], int], list | None]] = {}
+        self.max_suppliers = 0
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, store_product: StoreProduct, price: int, supplier_name: str) -> None:
+        """Добавляет предложение поставщика к товару магазина."""
+        entry = self.entries.get(store_product.code)
+        if entry is None:
+            entry = self.entries[store_product.code] = (store_product.orig_name, {}, [] if self.top_n else None)
+        _, offers, heap = entry
+
+        offer = (price, supplier_name)
+        if offer in offers:
+            return
+        sequence = self._sequence
+        self._sequence += 1
+
+        if heap is None:
+            offers[offer] = sequence
+        elif len(offers) < self.top_n:
+            offers[offer] = sequence
+            heapq.heappush(heap, (-price, -sequence, supplier_name))
+        elif price < -heap[0][0]:
+            # Новое предложение пришло позже всех, поэтому вытесняет самое дорогое только при строго меньшей цене.
+            # Вытесненное предложение при повторе снова проиграет, поэтому помнить его не нужно
+            evicted_price, _, evicted_supplier = heapq.heapreplace(heap, (-price, -sequence, supplier_name))
+            del offers[(-evicted_price, evicted_supplier)]
+            offers[offer] = sequence
+        else:
+            return
+
+        if len(offers) > self.max_suppliers:
+            self.max_suppliers = len(offers)
+
+    def add_all(self, offers: Iterable[tuple[StoreProduct, int, str]]) -> "FinalTable":
+        for store_product, price, supplier_name in offers:
+            self.add(store_product, price, supplier_name)
+        return self
+
+    def header(self) -> list[str]:
+        headers = ["Код", "Название"]
+        for i in range(1, self.max_suppliers + 1):
+            headers.extend([f"Поставщик {i}", f"Цена {i}"])
+        return headers
+
+    def rows(self) -> Iterator[list]:
+        """Строки CSV по одной: предложения от меньшей цены к большей, недостающие ячейки пустые."""
+        width = 2 + 2 * self.max_suppliers
+        for code, (orig_name, offers, _) in self.entries.items():
+            row = [code, orig_name]
+            for (price, supplier_name), _ in sorted(offers.items(), key=lambda item: (item[0][0], item[1])):
+                row.extend([supplier_name, price])
+            row.extend([""] * (width - len(row)))
+            yield row
+
+    def write_csv(self, output_file: str) -> None:
+        """Записывает таблицу в CSV построчно."""
+        with open(output_file, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(self.header())
+            writer.writerows(self.rows())
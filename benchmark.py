@@ -0,0 +1,147 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from statistics import median
+
+from main import build_final_table, write_final_prices
+from matcher import match_supplier_to_store
+from store_processing import load_store_data
+from supplier_processing import load_and_process_supplier_data
+from synthetic_data import generate_dataset
+
+# Бюджет времени импорта `main.py` для `--check-import-time` (мс)
+IMPORT_TIME_BUDGET_MS = 150.0
+
+# Модули, которые не должны загружаться при импорте `main.py`: GUI, тяжелые библиотеки сопоставления
+# и пул процессов (их модули импортируются там, где они нужны)
+STARTUP_FORBIDDEN_MODULES = ("tkinter", "turtle", "rapidfuzz", "numpy", "concurrent.futures")
+
+# Выполняется в отдельном процессе, чтобы модули не были загружены заранее
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({"elapsed_ms": elapsed_ms, "forbidden": [name for name in %r if name in sys.modules]}))
+"""
+
+def measure_import_time(runs: int = 5) -> tuple[float, list[str]]:
+    """
+    Импортирует `main.py` в `runs` новых процессах.
+    Возвращает (медиана времени импорта в мс, запрещенные модули, загруженные при импорте).
+    """
+    timings: list[float] = []
+    forbidden: set[str] = set()
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", IMPORT_PROBE % (STARTUP_FORBIDDEN_MODULES,)],
+                                capture_output=True, text=True, cwd=Path(__file__).parent, check=True).stdout
+        probe = json.loads(output)
+        timings.append(probe["elapsed_ms"])
+        forbidden.update(probe["forbidden"])
+    return round(median(timings), 2), sorted(forbidden)
+
+def check_import_time(budget_ms: float = IMPORT_TIME_BUDGET_MS, runs: int = 5) -> bool:
+    """Проверка запуска: импорт `main.py` укладывается в бюджет и не тянет запрещенные модули."""
+    elapsed_ms, forbidden = measure_import_time(runs)
+    print(f"Импорт main.py: {elapsed_ms} мс (бюджет {budget_ms} мс)")
+    if forbidden:
+        print(f"❌ При импорте загружены лишние модули: {', '.join(forbidden)}")
+    if elapsed_ms > budget_ms:
+        print("❌ Импорт дольше бюджета")
+    return not forbidden and elapsed_ms <= budget_ms
+
+@contextmanager
+def timed(timings: dict[str, float], stage: str):
+    """Записывает время выполнения блока в `timings[stage]` (секунды)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round(time.perf_counter() - start, 4)
+
+def run_stages(store_path: Path, supplier_path: Path, output_path: Path, workers: int = 1) -> dict:
+    """Прогоняет все этапы как `main.py` и замеряет каждый отдельно."""
+    timings: dict[str, float] = {}
+
+    with timed(timings, "store_load"):
+        color_synonyms, store_products = load_store_data(store_path)
+
+    with timed(timings, "supplier_load"):
+        supplier_products = load_and_process_supplier_data(supplier_path, color_synonyms)
+
+    with timed(timings, "matching"):
+        matches = match_supplier_to_store(supplier_products, store_products, workers=workers)
+
+    with timed(timings, "csv_output"):
+        med = median(matched.match_score for matched in matches) if matches else 0
+        offers = ((matched.store_product, matched.supplier_product.price, matched.supplier_product.supplier_name)
+                  for matched in matches if matched.match_score >= med)
+        final_table = build_final_table(offers)
+        write_final_prices(final_table, str(output_path))
+
+    return {
+        "store_products": len(store_products),
+        "supplier_products": len(supplier_products),
+        "matches": len(matches),
+        "final_rows": len(final_table),
+        "timings": timings,
+    }
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер этапов обработки на синтетических данных")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="Размеры прайс-листа поставщиков (от 1k до 1M строк)")
+    parser.add_argument("--store-size", type=int, default=5000, help="Количество товаров магазина")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="Количество процессов для сопоставления")
+    parser.add_argument("--data-dir", type=Path, default=None,
+                        help="Папка для сгенерированных CSV (по умолчанию временная)")
+    parser.add_argument("--output", type=Path, default=Path("benchmark_results.json"),
+                        help="JSON-файл с результатами")
+    parser.add_argument("--check-import-time", type=float, nargs="?", const=IMPORT_TIME_BUDGET_MS, default=None,
+                        metavar="MS", help="Только проверить время импорта main.py "
+                                           f"(по умолчанию бюджет {IMPORT_TIME_BUDGET_MS} мс), код выхода 1 при провале")
+    args = parser.parse_args()
+
+    if args.check_import_time is not None:
+        raise SystemExit(0 if check_import_time(args.check_import_time) else 1)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = args.data_dir or Path(tmp_dir)
+        results = []
+        for size in args.sizes:
+            store_path, supplier_path = generate_dataset(data_dir, args.store_size, size, args.seed)
+            result = run_stages(store_path, supplier_path, Path(tmp_dir) / "final_prices.csv", args.workers)
+            result["supplier_rows"] = size
+            results.append(result)
+            print(f"{size:>9} строк: " + ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in result["timings"].items()))
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "store_size": args.store_size,
+        "seed": args.seed,
+        "workers": args.workers,
+        "results": results,
+    }
+    args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n✅ Результаты сохранены в {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from types import ModuleType
+
+import csv_processing
+import matcher
+import store_index
+import store_processing
+from matcher import MatchedProduct, apply_storage_prediction, build_matched_products, find_store_matches, match_key
+from memo import DEFAULT_MEMO_SIZE, MatchMemo
+from store_processing import StoreProduct, load_store_data
+from supplier_processing import SupplierProduct
+
+# Меняется при изменении формата самого кэша
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_CACHE_DIR = Path(".cache")
+
+# Файл `MatchMemo` внутри папки кэша, общий для всех файлов поставщиков
+MEMO_FILE_NAME = "match_memo.sqlite3"
+
+def file_digest(path: Path) -> str:
+    """Возвращает sha256 содержимого файла."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def code_version(*modules: ModuleType) -> str:
+    """
+    Версия кода по исходникам модулей: любое изменение нормализации или подсчета баллов
+    меняет версию и делает старый кэш недействительным.
+    """
+    digest = hashlib.sha256(str(CACHE_FORMAT_VERSION).encode())
+    for module in modules:
+        digest.update(Path(module.__file__).read_bytes())
+    return digest.hexdigest()
+
+def read_cache(cache_path: Path, key: str):
+    """Возвращает данные из файла кэша, если он есть и записан для того же ключа, иначе None."""
+    try:
+        with open(cache_path, "rb") as fp:
+            cached_key, data = pickle.load(fp)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError, TypeError):
+        return None
+    return data if cached_key == key else None
+
+def write_cache(cache_path: Path, key: str, data) -> None:
+    """Атомарно записывает данные в файл кэша (через временный файл)."""
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as fp:
+        pickle.dump((key, data), fp, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+def cache_file_path(prefix: str, path: Path, cache_dir: Path) -> Path:
+    """Один файл кэша на входной файл, чтобы старые версии не копились."""
+    name = hashlib.sha256(str(Path(path).resolve()).encode()).hexdigest()[:16]
+    return Path(cache_dir) / f"{prefix}_{name}.pickle"
+
+def catalog_key(path: Path) -> str:
+    """Отпечаток каталога магазина: хэш содержимого файла и версия кода нормализации."""
+    return f"{file_digest(path)}:{code_version(csv_processing, store_processing)}"
+
+def load_store_catalog(path: Path, cache_dir: Path = DEFAULT_CACHE_DIR, rebuild: bool = False,
+                       key: str | None = None) -> tuple[dict[str, set[str]], list[StoreProduct]]:
+    """
+    Загружает синонимы цветов и обработанные товары магазина.
+    - Ключ кэша: `catalog_key` (можно передать заранее посчитанный).
+    - Если кэш актуален, CSV магазина не читается вовсе.
+    - `rebuild` — принудительно пересобрать кэш.
+    """
+    if key is None:
+        key = catalog_key(path)
+    cache_path = cache_file_path("store", path, cache_dir)
+
+    if not rebuild:
+        cached = read_cache(cache_path, key)
+        if cached is not None:
+            return cached
+
+    color_synonyms, store_products = load_store_data(path)
+    write_cache(cache_path, key, (color_synonyms, store_products))
+    return color_synonyms, store_products
+
+def match_key_digest(supplier_product: SupplierProduct) -> bytes:
+    """Компактный хэш `match_key` товара поставщика."""
+    return hashlib.blake2b(repr(match_key(supplier_product)).encode(), digest_size=16).digest()
+
+def match_incrementally(supplier_products: list[SupplierProduct], store_products: list[StoreProduct],
+                        store_key: str, cache_path: Path, workers: int = 1, vectorized: bool = False,
+                        batched_similarity: bool = False,
+                        similarity_workers: int = -1) -> tuple[list[MatchedProduct], int]:
+    """
+    Сопоставляет только новые и изменившиеся товары поставщика, остальные берет из прошлого запуска.
+    - Результаты прошлого запуска хранятся по хэшу нормализованного товара (`match_key`),
+      поэтому смена цены или поставщика не требует повторного сопоставления.
+    - Ключ файла включает отпечаток каталога и версию кода подсчета баллов:
+      при их изменении все товары сопоставляются заново.
+    Возвращает (совпадения, количество повторно использованных товаров).
+    """
+    key = f"{store_key}:{code_version(matcher, store_index)}"
+    previous: dict[bytes, tuple[int | None, float]] = read_cache(cache_path, key) or {}
+
+    # Предсказание памяти меняет модель, поэтому хэш считается после него
+    apply_storage_prediction(supplier_products)
+    digests = [match_key_digest(supplier_product) for supplier_product in supplier_products]
+
+    changed_digests = [digest for digest in digests if digest not in previous]
+    changed = [supplier_product for supplier_product, digest in zip(supplier_products, digests) if digest not in previous]
+    changed_results = dict(zip(changed_digests, find_store_matches(
+        changed, store_products, batched_similarity=batched_similarity, similarity_workers=similarity_workers,
+        workers=workers, vectorized=vectorized)))
+
+    # Сохраняются только товары текущего запуска, поэтому файл не растет бесконечно
+    results = {digest: previous[digest] if digest in previous else changed_results[digest] for digest in digests}
+
+    write_cache(cache_path, key, results)
+    matched_products = build_matched_products(supplier_products, store_products, [results[digest] for digest in digests])
+    return matched_products, len(supplier_products) - len(changed)
+
+def match_with_memo(supplier_products: list[SupplierProduct], store_products: list[StoreProduct],
+                    store_key: str, cache_dir: Path, workers: int = 1, vectorized: bool = False,
+                    max_entries: int = DEFAULT_MEMO_SIZE, batched_similarity: bool = False,
+                    similarity_workers: int = -1) -> tuple[list[MatchedProduct], int]:
+    """
+    Берет совпадения из `MatchMemo` (общего для всех файлов поставщиков и запусков),
+    сопоставляет только товары, которых там нет, и запоминает их.
+    - Отпечаток записей: `store_key` и версия кода подсчета баллов, как у `match_incrementally`.
+    - Запись используется, только если код товара магазина под сохраненным номером не изменился.
+    Возвращает (совпадения, количество товаров, взятых из памяти).
+    """
+    fingerprint = f"{store_key}:{code_version(matcher, store_index)}"
+    apply_storage_prediction(supplier_products)
+    digests = [match_key_digest(supplier_product) for supplier_product in supplier_products]
+
+    with MatchMemo(Path(cache_dir) / MEMO_FILE_NAME, fingerprint, max_entries) as memo:
+        results: dict[bytes, tuple[int | None, float]] = {}
+        for digest, (store_id, store_code, score) in memo.lookup(digests).items():
+            if store_id is None or (store_id < len(store_products) and store_products[store_id].code == store_code):
+                results[digest] = (store_id, score)
+
+        changed: dict[bytes, SupplierProduct] = {}
+        for supplier_product, digest in zip(supplier_products, digests):
+            if digest not in results:
+                changed.setdefault(digest, supplier_product)
+        changed_results = dict(zip(changed, find_store_matches(
+            list(changed.values()), store_products, batched_similarity=batched_similarity,
+            similarity_workers=similarity_workers, workers=workers, vectorized=vectorized)))
+        memo.store({digest: (store_id, store_products[store_id].code if store_id is not None else None, score)
+                    for digest, (store_id, score) in changed_results.items()})
+        results.update(changed_results)
+
+    reused = sum(1 for supplier_product, digest in zip(supplier_products, digests) if digest not in changed)
+    matched_products = build_matched_products(supplier_products, store_products, [results[digest] for digest in digests])
+    return matched_products, reused
@@ -1,8 +1,91 @@
+import codecs
 import csv
+import io
+import mmap
+import os
 from pathlib import Path
+from typing import Iterator
+
+# Сколько символов с начала файла смотрит `csv.Sniffer`
+SNIFF_SIZE = 5000
 
 def find_delimiter(path: Path) -> str:
     sniffer = csv.Sniffer()
     with open(path, encoding='utf-8') as fp:
-        delimiter = sniffer.sniff(fp.read(5000)).delimiter
+        delimiter = sniffer.sniff(fp.read(SNIFF_SIZE)).delimiter
     return delimiter
+
+class MappedCSV:
+    """
+    CSV-файл, отображенный в память (mmap) один раз: и для определения разделителя, и для чтения строк.
+    - Разделитель определяется по тем же первым `SNIFF_SIZE` символам, что и в `find_delimiter`.
+    - `chunks` делит файл на части по границам строк: граница ставится только после перевода строки,
+      до которого четное число кавычек, поэтому поле в кавычках с переводом строки не разрезается.
+    - Части можно разбирать независимо, в том числе в разных процессах (`read_rows` по пути и границам).
+    - Переводы строк обрабатываются так же, как при обычном `open` (`\\r\\n` и `\\r` становятся `\\n`).
+    """
+    def __init__(self, path: Path, delimiter: str | None = None) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as fp:
+            self.size = os.fstat(fp.fileno()).st_size
+            # Пустой файл отобразить нельзя
+            self._buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self._delimiter = delimiter
+
+    def __enter__(self) -> "MappedCSV":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    @property
+    def delimiter(self) -> str:
+        if self._delimiter is None:
+            # UTF-8 занимает до 4 байт на символ; недописанный последний символ декодер отбрасывает
+            sample = codecs.getincrementaldecoder("utf-8")().decode(self._buffer[:SNIFF_SIZE * 4])
+            sample = io.StringIO(sample, newline=None).read()  # Переводы строк как при чтении через `open`
+            self._delimiter = csv.Sniffer().sniff(sample[:SNIFF_SIZE]).delimiter
+        return self._delimiter
+
+    def chunks(self, count: int) -> list[tuple[int, int]]:
+        """Делит файл примерно на `count` частей по безопасным границам строк: [(начало, конец)] в байтах."""
+        buffer, size = self._buffer, self.size
+        if count <= 1 or size == 0:
+            return [(0, size)]
+
+        bounds: list[tuple[int, int]] = []
+        start = scanned = 0
+        odd_quotes = False  # Нечетное число кавычек между `start` и `scanned`
+        for part in range(1, count):
+            newline = buffer.find(b"\n", max(size * part // count, start))
+            while newline != -1:
+                odd_quotes ^= buffer[scanned:newline].count(b'"') % 2 == 1
+                scanned = newline
+                if not odd_quotes:
+                    break
+                newline = buffer.find(b"\n", newline + 1)
+            if newline == -1:
+                break
+            bounds.append((start, newline + 1))
+            start = scanned = newline + 1
+        bounds.append((start, size))
+        return [(begin, end) for begin, end in bounds if begin < end] or [(0, size)]
+
+    def rows(self, start: int = 0, end: int | None = None) -> list[list[str]]:
+        """Разбирает строки CSV между границами `chunks` (по умолчанию весь файл)."""
+        text = self._buffer[start:self.size if end is None else end].decode("utf-8")
+        return list(csv.reader(io.StringIO(text, newline=None), delimiter=self.delimiter))
+
+    def iter_rows(self, chunk_size: int = 1 << 24) -> Iterator[list[str]]:
+        """Выдает все строки файла, разбирая его частями по ~`chunk_size` байт (память не зависит от размера файла)."""
+        for start, end in self.chunks(max(1, self.size // chunk_size)):
+            yield from self.rows(start, end)
+
+def read_rows(path: Path, start: int, end: int, delimiter: str) -> list[list[str]]:
+    """Строки одной части файла, для процесса-исполнителя (mmap не передается между процессами)."""
+    with MappedCSV(path, delimiter) as mapped:
+        return mapped.rows(start, end)
@@ -0,0 +1,183 @@
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from statistics import median
+
+from main import build_final_table
+from matcher import (apply_storage_prediction, brand_clean_cache, build_matched_products, calculate_match_score,
+                     find_store_matches)
+from store_processing import StoreProduct, load_store_data
+from supplier_processing import SupplierProduct, load_and_process_supplier_data
+from synthetic_data import generate_dataset
+
+# Варианты сопоставления: имя -> параметры `find_store_matches`
+ENGINES: dict[str, dict] = {
+    "blocked": {},
+    "batched": {"batched_similarity": True},
+    "vectorized": {"vectorized": True},
+    "workers": {"workers": 2},
+    "ngram": {"ngram_k": 10},
+    "top_k": {"top_k": 100},
+}
+
+# Варианты, которые должны совпадать с эталоном; `ngram` и `top_k` приближенные и проверяются только по запросу
+EXACT_ENGINES = ("blocked", "batched", "vectorized", "workers")
+
+def exhaustive_matches(supplier_products: list[SupplierProduct],
+                       store_products: list[StoreProduct]) -> list[tuple[int | None, float]]:
+    """
+    Эталон: каждый товар поставщика сравнивается со всем каталогом без индексов и отсечений.
+    Выигрывает первый товар с наибольшими баллами (`score > best_score`), баллы <= 0 не считаются совпадением.
+    """
+    apply_storage_prediction(supplier_products)
+    results: list[tuple[int | None, float]] = []
+    for supplier_product in supplier_products:
+        best_id, best_score = None, 0
+        for idx, store_product in enumerate(store_products):
+            score = calculate_match_score(supplier_product, store_product)
+            if score > best_score:
+                best_id, best_score = idx, score
+        results.append((best_id, best_score))
+    return results
+
+def run_engine(name: str, supplier_products: list[SupplierProduct],
+               store_products: list[StoreProduct]) -> tuple[list[tuple[int | None, float]], float]:
+    """Сопоставляет товары выбранным способом (`exhaustive` или имя из `ENGINES`). Возвращает (результаты, секунды)."""
+    brand_clean_cache.clear()  # Каждый вариант начинает с пустым кэшем, чтобы ускорение было честным
+    start = time.perf_counter()
+    if name == "exhaustive":
+        results = exhaustive_matches(supplier_products, store_products)
+    else:
+        results = find_store_matches(supplier_products, store_products, **ENGINES[name])
+    return results, time.perf_counter() - start
+
+def final_rows(supplier_products: list[SupplierProduct], store_products: list[StoreProduct],
+               results: list[tuple[int | None, float]]) -> dict[str, list]:
+    """Строки итоговой таблицы по коду товара, как их собирает `main.py` (фильтр по медиане, без `top_n`)."""
+    matches = build_matched_products(supplier_products, store_products, results)
+    if not matches:
+        return {}
+    med = median(matched.match_score for matched in matches)
+    offers = ((matched.store_product, matched.supplier_product.price, matched.supplier_product.supplier_name)
+              for matched in matches if matched.match_score >= med)
+    return {row[0]: row for row in build_final_table(offers).rows()}
+
+def describe_pair(supplier_product: SupplierProduct, store_products: list[StoreProduct],
+                  store_id: int | None, reported_score: float) -> dict:
+    """Выбранный товар магазина, баллы от варианта и баллы пары, пересчитанные `calculate_match_score`."""
+    if store_id is None:
+        return {"code": None, "score": reported_score, "pair_score": None}
+    store_product = store_products[store_id]
+    return {"index": store_id, "code": store_product.code, "name": store_product.orig_name, "score": reported_score,
+            "pair_score": calculate_match_score(supplier_product, store_product)}
+
+def compare_results(supplier_products: list[SupplierProduct], store_products: list[StoreProduct],
+                    reference: list[tuple[int | None, float]], candidate: list[tuple[int | None, float]],
+                    max_examples: int = 10) -> dict:
+    """
+    Сравнивает результаты варианта с эталоном: выбранные товары, баллы и строки итоговой таблицы.
+    Для расхождений приводятся обе пары с баллами, пересчитанными заново:
+    при равных баллах пар расхождение — в выборе из равных (должен побеждать товар раньше в каталоге).
+    """
+    mismatches = []
+    for position, (supplier_product, expected, actual) in enumerate(zip(supplier_products, reference, candidate)):
+        if expected == actual:
+            continue
+        reference_pair = describe_pair(supplier_product, store_products, *expected)
+        candidate_pair = describe_pair(supplier_product, store_products, *actual)
+        if expected[0] == actual[0]:
+            kind = "score"
+        elif reference_pair["pair_score"] == candidate_pair["pair_score"]:
+            kind = "tie"
+        else:
+            kind = "choice"
+        mismatches.append({"position": position, "supplier_name": supplier_product.name, "kind": kind,
+                           "reference": reference_pair, "candidate": candidate_pair})
+
+    expected_rows = final_rows(supplier_products, store_products, reference)
+    actual_rows = final_rows(supplier_products, store_products, candidate)
+    row_diff = sorted(code for code in expected_rows.keys() | actual_rows.keys()
+                      if expected_rows.get(code) != actual_rows.get(code))
+    return {
+        "mismatches": len(mismatches),
+        "examples": mismatches[:max_examples],
+        "final_rows_different": len(row_diff),
+        "final_rows_examples": row_diff[:max_examples],
+        "equivalent": not mismatches and not row_diff,
+    }
+
+def check_equivalence(store_path: Path, supplier_path: Path, engines: list[str] | None = None,
+                      reference: str = "exhaustive", max_examples: int = 10) -> dict:
+    """
+    Прогоняет эталон и варианты на одних и тех же данных и сравнивает их.
+    Годится как проверка: `report["equivalent"]` — True, только если все варианты совпали с эталоном.
+    """
+    engines = list(EXACT_ENGINES if engines is None else engines)
+    color_synonyms, store_products = load_store_data(store_path)
+    supplier_products = load_and_process_supplier_data(supplier_path, color_synonyms)
+
+    reference_results, reference_seconds = run_engine(reference, supplier_products, store_products)
+    report = {
+        "store_file": str(store_path),
+        "supplier_file": str(supplier_path),
+        "store_products": len(store_products),
+        "supplier_products": len(supplier_products),
+        "reference": {"engine": reference, "seconds": round(reference_seconds, 4)},
+        "engines": {},
+    }
+    for engine in engines:
+        results, seconds = run_engine(engine, supplier_products, store_products)
+        comparison = compare_results(supplier_products, store_products, reference_results, results, max_examples)
+        comparison["seconds"] = round(seconds, 4)
+        comparison["speedup"] = round(reference_seconds / seconds, 2) if seconds else None
+        report["engines"][engine] = comparison
+    report["equivalent"] = all(comparison["equivalent"] for comparison in report["engines"].values())
+    return report
+
+def print_report(report: dict) -> None:
+    reference = report["reference"]
+    print(f"Магазин: {report['store_products']} товаров, поставщики: {report['supplier_products']} товаров")
+    print(f"Эталон {reference['engine']}: {reference['seconds']:.3f}s")
+    for engine, comparison in report["engines"].items():
+        status = "✅" if comparison["equivalent"] else "❌"
+        print(f"{status} {engine}: {comparison['seconds']:.3f}s (ускорение x{comparison['speedup']}), "
+              f"расхождений {comparison['mismatches']}, строк итоговой таблицы {comparison['final_rows_different']}")
+        for example in comparison["examples"]:
+            expected, actual = example["reference"], example["candidate"]
+            print(f"    [{example['kind']}] {example['supplier_name']!r}: "
+                  f"эталон {expected['code']} ({expected['score']}, пара {expected['pair_score']}), "
+                  f"вариант {actual['code']} ({actual['score']}, пара {actual['pair_score']})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка, что варианты сопоставления дают те же результаты, что и эталон")
+    parser.add_argument("--store", type=Path, default=None, help="CSV магазина (иначе данные генерируются)")
+    parser.add_argument("--supplier", type=Path, default=None, help="CSV поставщиков (вместе с --store)")
+    parser.add_argument("--store-size", type=int, default=500, help="Размер сгенерированного каталога")
+    parser.add_argument("--supplier-size", type=int, default=2000, help="Размер сгенерированного прайс-листа")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=list(EXACT_ENGINES),
+                        help=f"Проверяемые варианты (по умолчанию точные: {', '.join(EXACT_ENGINES)})")
+    parser.add_argument("--reference", choices=["exhaustive", *ENGINES], default="exhaustive",
+                        help="Эталон: полный перебор (по умолчанию) или один из вариантов")
+    parser.add_argument("--max-examples", type=int, default=10, help="Сколько расхождений выводить на вариант")
+    parser.add_argument("--output", type=Path, default=None, help="Сохранить отчет в JSON")
+    args = parser.parse_args()
+    if (args.store is None) != (args.supplier is None):
+        parser.error("--store и --supplier задаются вместе")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.store is None:
+            store_path, supplier_path = generate_dataset(Path(tmp_dir), args.store_size, args.supplier_size, args.seed)
+        else:
+            store_path, supplier_path = args.store, args.supplier
+        report = check_equivalence(store_path, supplier_path, args.engines, args.reference, args.max_examples)
+
+    print_report(report)
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    raise SystemExit(0 if report["equivalent"] else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import cProfile
+import json
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+class RunStats:
+    """
+    Замеры одного запуска: время и пиковая память по этапам, накопленное время подзадач и счетчики.
+    - По умолчанию выключено: `count` и `add_time` сразу выходят, а горячие места проверяют
+      `STATS.enabled` сами, поэтому без `--stats` накладные расходы почти нулевые.
+    - Пиковая память считается через `tracemalloc` только при `trace_memory` (он заметно замедляет работу).
+    """
+    def __init__(self) -> None:
+        self.enabled = False
+        self.trace_memory = False
+        self.stages: dict[str, dict[str, float]] = {}
+        self.timers: Counter[str] = Counter()
+        self.counters: Counter[str] = Counter()
+
+    def enable(self, trace_memory: bool = False) -> None:
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Замеряет этап: время и (при `trace_memory`) пиковую память внутри него."""
+        if not self.enabled:
+            yield
+            return
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage = self.stages.setdefault(name, {"seconds": 0.0})
+            stage["seconds"] = round(stage["seconds"] + time.perf_counter() - start, 4)
+            if self.trace_memory:
+                peak_mb = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+                stage["peak_memory_mb"] = max(stage.get("peak_memory_mb", 0.0), peak_mb)
+
+    def count(self, name: str, value: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] += value
+
+    def add_time(self, name: str, seconds: float) -> None:
+        if self.enabled:
+            self.timers[name] += seconds
+
+    def take_counters(self) -> dict[str, int] | None:
+        """Забирает и обнуляет счетчики (для передачи из процесса-исполнителя в основной)."""
+        if not self.enabled:
+            return None
+        counters = dict(self.counters)
+        self.counters.clear()
+        return counters
+
+    def merge_counters(self, counters: dict[str, int] | None) -> None:
+        if counters:
+            self.counters.update(counters)
+
+    def report(self) -> dict:
+        """Отчет в виде словаря для JSON."""
+        lookups = self.counters["brand_clean_cache_hits"] + self.counters["brand_clean_cache_misses"]
+        exact_lookups = self.counters["exact_key_hits"] + self.counters["exact_key_misses"]
+        derived = {
+            "brand_clean_cache_hit_rate": round(self.counters["brand_clean_cache_hits"] / lookups, 4) if lookups else None,
+            "exact_key_hit_rate": round(self.counters["exact_key_hits"] / exact_lookups, 4) if exact_lookups else None,
+        }
+        return {
+            "stages": self.stages,
+            "timers": {name: round(seconds, 4) for name, seconds in self.timers.items()},
+            "counters": dict(self.counters),
+            "derived": derived,
+        }
+
+    def print_report(self) -> None:
+        report = self.report()
+        print("\n📊 Статистика запуска:")
+        for name, stage in report["stages"].items():
+            memory = f", пик памяти {stage['peak_memory_mb']} МБ" if "peak_memory_mb" in stage else ""
+            print(f"  {name}: {stage['seconds']:.3f}s{memory}")
+        for name, seconds in report["timers"].items():
+            print(f"  {name}: {seconds:.3f}s")
+        for name, value in sorted(report["counters"].items()):
+            print(f"  {name}: {value}")
+        for name, value in report["derived"].items():
+            print(f"  {name}: {value}")
+
+    def write(self, path: Path) -> None:
+        Path(path).write_text(json.dumps(self.report(), ensure_ascii=False, indent=2), encoding="utf-8")
+
+# Замеры процесса; включаются флагом `--stats` в `main.py`
+STATS = RunStats()
+
+def init_worker_stats(collect_stats: bool) -> None:
+    """Настраивает замеры в процессе-исполнителе; счетчики, унаследованные при fork, уже учтены в основном процессе."""
+    STATS.counters.clear()
+    if collect_stats:
+        STATS.enable()
+
+@contextmanager
+def profiled(output_path: Path | None) -> Iterator[None]:
+    """Профилирует блок через cProfile и сохраняет результат в `output_path` (для `pstats`/snakeviz)."""
+    if output_path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(str(output_path))
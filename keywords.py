@@ -0,0 +1,77 @@
+from array import array
+from contextlib import contextmanager
+import sys
+from typing import Iterable, Iterator
+
+class KeywordVocabulary:
+    """
+    Общий словарь ключевых слов: строка -> целый номер.
+    - Каждое слово хранится один раз (через `sys.intern`).
+    - Наборы ключевых слов товаров хранятся как отсортированные массивы номеров `array('I')`.
+    - Номера действуют только внутри процесса: при pickle товары сохраняют сами слова.
+    - Словарь с `parent` — временное дополнение (`overlay`): слова родителя берутся из него,
+      новые слова получают номера после последнего номера родителя и в родителя не попадают.
+      Пока дополнение используется, родитель не должен пополняться.
+    """
+    def __init__(self, parent: "KeywordVocabulary | None" = None) -> None:
+        self.ids: dict[str, int] = {}
+        self.words: list[str] = []
+        self.parent = parent
+        self.base = len(parent) if parent is not None else 0
+
+    def __len__(self) -> int:
+        return self.base + len(self.words)
+
+    def overlay(self) -> "KeywordVocabulary":
+        """Временный словарь поверх этого, например для одного запроса к сервису."""
+        return KeywordVocabulary(self)
+
+    def encode(self, keywords: Iterable[str]) -> array:
+        """Переводит набор слов в отсортированный массив номеров, добавляя новые слова в словарь."""
+        ids = self.ids
+        parent_ids = self.parent.ids if self.parent is not None else {}
+        keyword_ids = []
+        for keyword in keywords:
+            keyword_id = parent_ids.get(keyword)
+            if keyword_id is None:
+                keyword_id = ids.get(keyword)
+            if keyword_id is None:
+                keyword_id = ids[keyword] = len(self)
+                # Слова дополнения живут недолго, интернировать их незачем
+                self.words.append(sys.intern(keyword) if self.parent is None else keyword)
+            keyword_ids.append(keyword_id)
+        keyword_ids.sort()
+        return array("I", keyword_ids)
+
+    def decode(self, keyword_ids: Iterable[int]) -> set[str]:
+        """Переводит номера обратно в набор слов."""
+        words, base = self.words, self.base
+        parent_words = self.parent.words if self.parent is not None else []
+        return {parent_words[keyword_id] if keyword_id < base else words[keyword_id - base]
+                for keyword_id in keyword_ids}
+
+# Словарь ключевых слов процесса, общий для товаров магазина и поставщиков
+KEYWORDS = KeywordVocabulary()
+
+# Словарь, в который записываются слова создаваемых товаров (см. `use_vocabulary`)
+_current_vocabulary = KEYWORDS
+
+def current_vocabulary() -> KeywordVocabulary:
+    return _current_vocabulary
+
+@contextmanager
+def use_vocabulary(vocabulary: KeywordVocabulary) -> Iterator[KeywordVocabulary]:
+    """
+    Товары, созданные внутри блока (в том числе при загрузке из кэша), хранят слова в `vocabulary`,
+    а не в общем `KEYWORDS`. Каждый товар запоминает свой словарь, поэтому и после блока слова читаются верно.
+    """
+    global _current_vocabulary
+    previous, _current_vocabulary = _current_vocabulary, vocabulary
+    try:
+        yield vocabulary
+    finally:
+        _current_vocabulary = previous
+
+def intern_optional(value: str | None) -> str | None:
+    """Интернирует повторяющиеся строки (бренды, цвета, поставщики), чтобы хранить их один раз."""
+    return sys.intern(value) if value is not None else None
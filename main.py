@@ -1,88 +1,307 @@
-import csv
+import argparse
+from collections import deque
 from statistics import median
-import sys
 from pathlib import Path
-from store_processing import generate_color_synonyms, load_and_process_store_data
-from supplier_processing import load_and_process_supplier_data
-from matcher import match_supplier_to_store
+from typing import Iterable, Iterator
+from aggregation import FinalTable
+from cache import (DEFAULT_CACHE_DIR, cache_file_path, catalog_key, load_store_catalog, match_incrementally,
+                   match_with_memo)
+from instrumentation import STATS, profiled
+from memo import DEFAULT_MEMO_SIZE
+from store_processing import StoreProduct, merge_color_synonyms
+from streaming import MatchSpool
+from supplier_processing import SupplierProduct, expand_supplier_paths, iter_supplier_files, load_supplier_files
+from matcher import (MatchedProduct, StoreMatcher, build_matched_products, find_multi_store_matches,
+                     iter_store_matches, match_supplier_to_store)
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Сопоставление прайс-листа поставщиков с товарами магазина")
+    parser.add_argument("supplier_filename",
+                        help="CSV-файл с прайс-листом поставщиков, папка с такими файлами или шаблон (\"prices/*.csv\")")
+    parser.add_argument("store_filenames", nargs="+", metavar="store_filename",
+                        help="CSV-файл с товарами магазина; несколько файлов — несколько каталогов за один запуск")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Количество процессов для разбора файлов поставщиков и сопоставления (по умолчанию 1)")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR,
+                        help=f"Папка для кэша обработанного каталога магазина (по умолчанию {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--rebuild-cache", action="store_true",
+                        help="Пересобрать кэш каталога магазина, даже если он актуален")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--incremental", action="store_true",
+                      help="Сопоставлять только новые и изменившиеся товары поставщика, остальное брать из прошлого запуска")
+    mode.add_argument("--memo", action="store_true",
+                      help="Брать совпадения из общей памяти прошлых запусков (SQLite в папке кэша) для любых файлов")
+    mode.add_argument("--streaming", action="store_true",
+                      help="Потоковая обработка больших прайс-листов с ограниченным потреблением памяти")
+    parser.add_argument("--memo-size", type=int, default=DEFAULT_MEMO_SIZE,
+                        help=f"Сколько записей хранит память совпадений (по умолчанию {DEFAULT_MEMO_SIZE})")
+    parser.add_argument("--stats", type=Path, nargs="?", const=Path("run_stats.json"), default=None,
+                        help="Вывести время этапов и счетчики и сохранить их в JSON (по умолчанию run_stats.json)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Вместе с --stats замерять пиковую память этапов через tracemalloc (замедляет работу)")
+    parser.add_argument("--profile", type=Path, default=None,
+                        help="Сохранить профиль cProfile этапа сопоставления в файл")
+    parser.add_argument("--top-n", type=int, default=None,
+                        help="Оставлять у каждого товара только N самых дешевых предложений")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="Считать баллы пачками в NumPy (результат тот же, нужен numpy)")
+    parser.add_argument("--ngram-k", type=int, default=None, metavar="K",
+                        help="Оценивать сначала товары K моделей, ближайших по символьным n-граммам (приближенно)")
+    parser.add_argument("--batched-similarity", action="store_true",
+                        help="Считать схожесть моделей заранее матрицами rapidfuzz.process.cdist по брендам (результат тот же)")
+    parser.add_argument("--similarity-workers", type=int, default=None, metavar="N",
+                        help="Потоков для --batched-similarity (по умолчанию все ядра, при --workers > 1 — один)")
+    parser.add_argument("--top-k", type=int, default=None, metavar="K",
+                        help="Полностью оценивать только K товаров с наибольшим числом общих ключевых слов (приближенно)")
+    args = parser.parse_args()
+    approximate = [(flag, value) for flag, value in (("--ngram-k", args.ngram_k), ("--top-k", args.top_k))
+                   if value is not None]
+    if len(approximate) > 1:
+        parser.error("--ngram-k и --top-k — разные способы отбора кандидатов, задается один")
+    for flag, value in approximate:
+        # Приближенные результаты не должны попадать в кэши точных совпадений
+        if args.incremental or args.memo or args.vectorized:
+            parser.error(f"{flag} несовместим с --incremental, --memo и --vectorized")
+        if value < 1:
+            parser.error(f"{flag} должен быть положительным")
+    if args.similarity_workers is not None:
+        if not args.batched_similarity:
+            parser.error("--similarity-workers задается вместе с --batched-similarity")
+        if args.similarity_workers == 0 or args.similarity_workers < -1:
+            parser.error("--similarity-workers должен быть положительным или -1 (все ядра)")
+    else:
+        args.similarity_workers = -1
+    if args.top_n is not None and args.top_n < 1:
+        parser.error("--top-n должен быть положительным")
+    if args.memo_size < 1:
+        parser.error("--memo-size должен быть положительным")
+    if args.trace_memory and args.stats is None:
+        parser.error("--trace-memory задается вместе с --stats")
+    if len(args.store_filenames) > 1 and (args.incremental or args.memo or args.streaming):
+        parser.error("несколько каталогов магазинов несовместимы с --incremental, --memo и --streaming")
+    return args
+
+def build_final_table(offers: Iterable[tuple[StoreProduct, int, str]], top_n: int | None = None) -> FinalTable:
+    """
+    Собирает итоговую таблицу из предложений (товар магазина, цена, поставщик), прошедших фильтр по медиане.
+    Если задан `top_n`, у каждого товара остаются только `top_n` самых дешевых предложений.
+    """
+    return FinalTable(top_n).add_all(offers)
+
+def write_final_prices(final_table: FinalTable, output_file: str) -> None:
+    """Записывает итоговую таблицу в CSV построчно, цены каждого товара от меньшей к большей."""
+    final_table.write_csv(output_file)
+
+def report_file_errors(errors: list[tuple[Path, str]]) -> None:
+    """Выводит файлы поставщиков, которые не удалось обработать."""
+    for path, error in errors:
+        print(f"⚠️ Файл поставщика пропущен: {path} ({error})")
+
+def output_files(store_paths: list[Path]) -> list[str]:
+    """Имена итоговых CSV: `final_prices.csv` для одного каталога, `final_prices_<каталог>.csv` для нескольких."""
+    if len(store_paths) == 1:
+        return ["final_prices.csv"]
+    names = [f"final_prices_{path.stem}.csv" for path in store_paths]
+    if len(set(names)) != len(names):
+        raise SystemExit("❌ У каталогов магазинов совпадают имена файлов, итоговые CSV перезапишут друг друга")
+    return names
+
+def load_suppliers(supplier_paths: list[Path], color_synonyms: dict[str, set[str]],
+                   workers: int) -> list[SupplierProduct]:
+    """Загружает все прайс-листы; файлы с ошибками пропускаются, но хотя бы один должен обработаться."""
+    with STATS.stage("supplier_load"):
+        supplier_products, errors = load_supplier_files(supplier_paths, color_synonyms, workers)
+    report_file_errors(errors)
+    if len(errors) == len(supplier_paths):
+        raise SystemExit("❌ Не удалось обработать ни одного файла поставщиков")
+    return supplier_products
+
+def save_final_table(final_table: FinalTable, output_file: str) -> None:
+    with STATS.stage("csv_output"):
+        write_final_prices(final_table, output_file)
+    print(f"\n✅ Итоговый CSV-файл сохранен как {output_file}")
+
+def filter_and_build_table(matches: list[MatchedProduct], top_n: int | None = None) -> FinalTable | None:
+    """
+    Отсекает совпадения ниже медианы баллов и собирает из остальных итоговую таблицу.
+    Если совпадений нет, медиану не посчитать, и возвращается None.
+    """
+    if not matches:
+        return None
+    with STATS.stage("median_filter"):
+        scores = sorted(matched.match_score for matched in matches)
+        med = median(scores)
+        if STATS.enabled:
+            STATS.count("median_filter_dropped", sum(1 for score in scores if score < med))
+
+    print(f"Медиана: {med}\n{scores}")
+
+    with STATS.stage("aggregation"):
+        offers = ((matched.store_product, matched.supplier_product.price, matched.supplier_product.supplier_name)
+                  for matched in matches if matched.match_score >= med)
+        return build_final_table(offers, top_n)
+
+def run_multi_store(supplier_paths: list[Path], store_paths: list[Path],
+                    catalogs: list[tuple[dict[str, set[str]], list[StoreProduct]]], outputs: list[str],
+                    workers: int, top_n: int | None = None, vectorized: bool = False,
+                    ngram_k: int | None = None, top_k: int | None = None, batched_similarity: bool = False,
+                    similarity_workers: int = -1) -> None:
+    """
+    Один прайс-лист и несколько каталогов магазинов: по итоговому CSV из `outputs` на каталог.
+    - Прайс-листы разбираются один раз по объединенному словарю цветов всех каталогов
+      (`merge_color_synonyms`), поэтому цвет поставщика может определиться не так,
+      как при запуске с одним каталогом, если словари цветов каталогов различаются.
+    - Каждое предложение сопоставляется со всеми каталогами за один проход (`find_multi_store_matches`),
+      медиана и итоговая таблица считаются по каждому каталогу отдельно.
+    - Таблица каждого каталога записывается сразу; каталог без совпадений пропускается с предупреждением,
+      остальные записываются.
+    """
+    color_synonyms = merge_color_synonyms(colors for colors, _ in catalogs)
+    supplier_products = load_suppliers(supplier_paths, color_synonyms, workers)
+
+    with STATS.stage("matching"):
+        results = find_multi_store_matches(supplier_products, [store_products for _, store_products in catalogs],
+                                           workers, vectorized, ngram_k, top_k, batched_similarity,
+                                           similarity_workers)
+
+    written = 0
+    for store_path, (_, store_products), catalog_results, output_file in zip(store_paths, catalogs, results, outputs):
+        print(f"\nКаталог {store_path}:")
+        final_table = filter_and_build_table(build_matched_products(supplier_products, store_products,
+                                                                    catalog_results), top_n)
+        if final_table is None:
+            print(f"⚠️ Ни одно предложение не сопоставилось с каталогом {store_path}, {output_file} не записан")
+            continue
+        save_final_table(final_table, output_file)
+        written += 1
+    if written == 0:
+        raise SystemExit("❌ Ни одно предложение поставщиков не сопоставилось ни с одним каталогом магазина")
+
+def run_streaming(supplier_paths: list[Path], store_products: list[StoreProduct], color_synonyms: dict[str, set[str]],
+                  workers: int, top_n: int | None = None, vectorized: bool = False,
+                  ngram_k: int | None = None, top_k: int | None = None, batched_similarity: bool = False,
+                  similarity_workers: int = -1) -> FinalTable:
+    """
+    Потоковый режим для больших прайс-листов: память зависит от размера каталога, а не файла поставщиков.
+    1. Товары поставщика читаются (файлы по очереди) и сопоставляются по одному, совпадения пишутся во временный файл.
+       Совпадения файла, который не удалось дочитать, отбрасываются целиком, как в `load_supplier_files`.
+    2. Медиана баллов считается точно по гистограмме и второму проходу по файлу (`MatchSpool.median`).
+    3. Третий проход собирает итоговую таблицу из совпадений не ниже медианы.
+    """
+    store_matcher = StoreMatcher(store_products, top_k, batched_similarity, similarity_workers, vectorized, ngram_k)
+    errors: list[tuple[Path, str]] = []
+    # Номера файлов товаров, отправленных на сопоставление; результаты приходят в том же порядке
+    file_numbers: deque[int] = deque()
+
+    def supplier_products() -> Iterator[SupplierProduct]:
+        for file_number, supplier_product in iter_supplier_files(supplier_paths, color_synonyms, errors):
+            file_numbers.append(file_number)
+            yield supplier_product
+
+    with MatchSpool() as spool:
+        def close_file(file_number: int | None, mark: int) -> None:
+            # Результаты следующего файла (или конец потока) приходят после того, как файл дочитан,
+            # поэтому его ошибка к этому моменту уже в `errors`
+            if file_number is not None and any(path == supplier_paths[file_number] for path, _ in errors):
+                STATS.count("supplier_matches_dropped", spool.rollback(mark))
+
+        with STATS.stage("supplier_load_and_matching"):
+            current_file, mark = None, 0
+            for supplier_product, best_id, best_score in iter_store_matches(store_matcher, supplier_products(),
+                                                                            workers):
+                file_number = file_numbers.popleft()
+                if file_number != current_file:
+                    close_file(current_file, mark)
+                    current_file, mark = file_number, spool.mark()
+                if best_id is not None:
+                    spool.append(best_id, best_score, supplier_product.price, supplier_product.supplier_name)
+            close_file(current_file, mark)
+        report_file_errors(errors)
+        if len(errors) == len(supplier_paths):
+            raise SystemExit("❌ Не удалось обработать ни одного файла поставщиков")
+        if spool.count == 0:
+            raise SystemExit("❌ Ни одно предложение поставщиков не сопоставилось с каталогом магазина")
+
+        with STATS.stage("median_filter"):
+            med = spool.median()
+            if STATS.enabled:
+                STATS.count("median_filter_dropped", sum(1 for _, score, _, _ in spool if score < med))
+        print(f"Медиана: {med} (совпадений: {spool.count})")
+
+        with STATS.stage("aggregation"):
+            offers = ((store_products[store_id], price, supplier_name)
+                      for store_id, score, price, supplier_name in spool if score >= med)
+            return build_final_table(offers, top_n)
 
 def main():
-    if len(sys.argv) < 3:
-        print('Usage: python main.py <supplier_filename>.csv <store_filename>.csv')
-        return
-    filename_supplier = sys.argv[1]
-    filename_store = sys.argv[2]
+    args = parse_args()
+    filename_supplier = args.supplier_filename
+    store_paths = [Path(filename) for filename in args.store_filenames]
     print('Supplier filename:', filename_supplier)
-    print('Store filename:', filename_store)
+    print('Store filename:', ", ".join(args.store_filenames))
 
-    color_synonyms = generate_color_synonyms(Path(filename_store))
-    store_products = load_and_process_store_data(Path(filename_store), color_synonyms)
-    supplier_products = load_and_process_supplier_data(Path(filename_supplier), color_synonyms)
+    if args.stats is not None:
+        STATS.enable(trace_memory=args.trace_memory)
 
-    scores = []
-    matches = match_supplier_to_store(supplier_products, store_products)
-    for matched in matches:
-        scores.append(matched.match_score)
-    scores.sort()
-    med = median(scores)
+    supplier_paths = expand_supplier_paths(filename_supplier)
+    if not supplier_paths:
+        raise SystemExit(f"❌ Файлы поставщиков не найдены: {filename_supplier}")
+    if len(supplier_paths) > 1:
+        print(f"Файлов поставщиков: {len(supplier_paths)}")
+    outputs = output_files(store_paths)
 
-    print(f"Медиана: {med}\n{scores}")
+    with STATS.stage("store_load"):
+        store_keys = [catalog_key(path) for path in store_paths]
+        catalogs = [load_store_catalog(path, args.cache_dir, args.rebuild_cache, store_key)
+                    for path, store_key in zip(store_paths, store_keys)]
+    color_synonyms, store_products = catalogs[0]
+    store_key = store_keys[0]
 
-    # Создаем словарь {код товара из магазина -> {название: ..., цены: [(цена, поставщик), ...]}}
-    final_table = {}
-    max_suppliers = 0
-    for matched in matches:
-        if matched.match_score >= med:
-            store_product = matched.store_product
-            supplier_product = matched.supplier_product
-
-            code = store_product.code
-            orig_name = store_product.orig_name
-            price = supplier_product.price
-            supplier_name = supplier_product.supplier_name
-
-            # Если товара еще нет в таблице - создаем
-            if code not in final_table:
-                final_table[code] = {"orig_name": orig_name, "prices": []}
-
-            # Добавляем цену и поставщика
-            if (price, supplier_name) not in final_table[code]["prices"]:
-                final_table[code]["prices"].append((price, supplier_name))
-
-            max_suppliers = max(max_suppliers, len(final_table[code]["prices"]))
-            
-    # Подготавливаем данные к записи в CSV
-    csv_data = []
-
-    # Заголовки CSV
-    headers = ["Код", "Название"]
-    for i in range(1, max_suppliers + 1):
-        headers.extend([f"Поставщик {i}", f"Цена {i}"])
-
-    # Заполняем строки CSV
-    for code, data in final_table.items():
-        row = [code, data["orig_name"]]
-        
-        # Сортируем цены от меньшей к большей
-        sorted_prices = sorted(data["prices"], key=lambda x: x[0])
-
-        # Добавляем цены и поставщиков в строку
-        for price, supplier in sorted_prices:
-            row.extend([supplier, price])
-
-        # Дополняем пустыми значениями, если поставщиков меньше max_suppliers
-        while len(row) < len(headers):
-            row.append("")
-
-        csv_data.append(row)
-
-    # Записываем в CSV
-    output_file = "final_prices.csv"
-    with open(output_file, "w", encoding="utf-8", newline="") as f:
-        writer = csv.writer(f, delimiter=";")
-        writer.writerow(headers)
-        writer.writerows(csv_data)
+    if len(catalogs) > 1:
+        print(f"Каталогов магазинов: {len(catalogs)}")
+        with profiled(args.profile):
+            run_multi_store(supplier_paths, store_paths, catalogs, outputs, args.workers, args.top_n,
+                            args.vectorized, args.ngram_k, args.top_k, args.batched_similarity,
+                            args.similarity_workers)
+    elif args.streaming:
+        # Чтение поставщиков и сопоставление идут вперемешку, поэтому профилируются вместе
+        with profiled(args.profile):
+            final_table = run_streaming(supplier_paths, store_products, color_synonyms, args.workers,
+                                        args.top_n, args.vectorized, args.ngram_k, args.top_k,
+                                        args.batched_similarity, args.similarity_workers)
+        save_final_table(final_table, outputs[0])
+    else:
+        supplier_products = load_suppliers(supplier_paths, color_synonyms, args.workers)
 
-    print(f"\n✅ Итоговый CSV-файл сохранен как {output_file}")
+        with STATS.stage("matching"), profiled(args.profile):
+            if args.incremental:
+                matches_cache_path = cache_file_path("matches", Path(filename_supplier), args.cache_dir)
+                matches, reused = match_incrementally(supplier_products, store_products, store_key,
+                                                      matches_cache_path, args.workers, args.vectorized,
+                                                      args.batched_similarity, args.similarity_workers)
+                STATS.count("incremental_reused", reused)
+                print(f"Повторно использовано совпадений: {reused} из {len(supplier_products)}")
+            elif args.memo:
+                matches, reused = match_with_memo(supplier_products, store_products, store_key, args.cache_dir,
+                                                  args.workers, args.vectorized, args.memo_size,
+                                                  args.batched_similarity, args.similarity_workers)
+                STATS.count("memo_reused", reused)
+                print(f"Совпадений из памяти: {reused} из {len(supplier_products)}")
+            else:
+                matches = match_supplier_to_store(supplier_products, store_products, args.top_k,
+                                                  args.batched_similarity, args.similarity_workers, args.workers,
+                                                  args.vectorized, args.ngram_k)
+
+        final_table = filter_and_build_table(matches, args.top_n)
+        if final_table is None:
+            raise SystemExit("❌ Ни одно предложение поставщиков не сопоставилось с каталогом магазина")
+        save_final_table(final_table, outputs[0])
+
+    if STATS.enabled:
+        STATS.print_report()
+        STATS.write(args.stats)
+        print(f"📊 Статистика сохранена в {args.stats}")
+    if args.profile is not None:
+        print(f"🔍 Профиль сопоставления сохранен в {args.profile}")
 if __name__ == '__main__':
     main()
@@ -1,7 +1,17 @@
-from rapidfuzz import fuzz
+from collections import deque
+from functools import partial
+from itertools import islice
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+
+from instrumentation import STATS, init_worker_stats
+from memo import LRUCache
+from store_index import KeywordIndex, ModelNgramIndex, StoreIndex, exact_key
 from store_processing import BRAND_SYNONYMS, StoreProduct
 from supplier_processing import SupplierProduct
 
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
 class MatchedProduct:
     def __init__(self, supplier_product: SupplierProduct, store_product: StoreProduct, match_score: float):
         self.supplier_product = supplier_product
@@ -19,8 +29,9 @@ class MatchedProduct:
             "match_score": self.match_score
         }
 
-# Кэш для уже обработанных моделей
-brand_clean_cache = {}
+# Кэш для уже обработанных моделей; размер ограничен, чтобы долгоживущий процесс (`server.py`) не рос без предела
+BRAND_CLEAN_CACHE_SIZE = 1 << 16
+brand_clean_cache = LRUCache(BRAND_CLEAN_CACHE_SIZE)
 
 # Создаем set всех возможных брендов и вариаций
 all_brand_variations = set(variation for variations in BRAND_SYNONYMS.values() for variation in variations)
@@ -29,8 +40,12 @@ def remove_brand_variations(text: str) -> str:
     """
     Удаляет бренд и его вариации из строки
     """
-    if text in brand_clean_cache:
-        return brand_clean_cache[text]
+    cleaned_text = brand_clean_cache.get(text)
+    if cleaned_text is not None:
+        if STATS.enabled:
+            STATS.counters["brand_clean_cache_hits"] += 1
+        return cleaned_text
+    STATS.count("brand_clean_cache_misses")
 
     words = text.lower().split()  # Разбиваем текст на слова
     cleaned_words = [word for word in words if word not in all_brand_variations]  # Убираем бренды
@@ -39,6 +54,15 @@ def remove_brand_variations(text: str) -> str:
     brand_clean_cache[text] = cleaned_text  # Кэшируем
     return cleaned_text
 
+def fuzz_ratio(model_1: str, model_2: str) -> float:
+    """
+    `rapidfuzz.fuzz.ratio`. rapidfuzz импортируется при первом вызове, а не при импорте модуля:
+    запуски без сопоставления (например, только пересборка кэша) его не загружают.
+    """
+    global fuzz_ratio
+    from rapidfuzz.fuzz import ratio as fuzz_ratio
+    return fuzz_ratio(model_1, model_2)
+
 def calculate_similarity(model_1: str, model_2: str) -> float:
     """
     Сравнивает две модели по схожести.
@@ -50,68 +74,570 @@ def calculate_similarity(model_1: str, model_2: str) -> float:
     if model_1_clean == model_2_clean:
         return 100.0  # Полное совпадение
 
-    return fuzz.ratio(model_1_clean, model_2_clean)  # Отношение схожести (0-100)
+    if STATS.enabled:
+        STATS.counters["fuzz_ratio_calls"] += 1
+    return fuzz_ratio(model_1_clean, model_2_clean)  # Отношение схожести (0-100)
 
+def predict_storage(supplier_product: SupplierProduct) -> tuple[int | None, str]:
+    """
+    Из-за гугл пикселя пытаюсь предсказать потенциальный объем внутренней памяти по модели.
+    Возвращает (объем памяти, модель без объема), товар не изменяет.
+    """
+    if not supplier_product.storage:
+        for predicted_storage in ["64", "128", "256", "512", "1024"]:
+            if predicted_storage in supplier_product.model:
+                return int(predicted_storage), supplier_product.model.replace(predicted_storage, "").strip()
+    return supplier_product.storage, supplier_product.model
 
-def match_supplier_to_store(supplier_products: list[SupplierProduct], store_products: list[StoreProduct]) -> list[MatchedProduct]:
+class BatchedSimilarity:
     """
-    Сопоставляет товары поставщиков с товарами магазина.
-    - Использует ключевые слова (`synonyms`) для поиска наиболее похожих товаров.
-    - Учитывает совпадение RAM, Storage, цвета и модели.
+    Схожесть моделей без бренда, посчитанная заранее матрицами `rapidfuzz.process.cdist`.
+    - Для каждого бренда считается одна матрица: модели поставщиков × модели магазина этого бренда.
+    - `workers` передается в `cdist` (-1 — все ядра).
+    - Значения совпадают с `calculate_similarity`, для пар вне матриц используется она же.
     """
-    matched_products: list[MatchedProduct] = []
+    def __init__(self, supplier_products: list[SupplierProduct], index: StoreIndex, workers: int = -1) -> None:
+        import numpy as np
+        from rapidfuzz import fuzz, process
+
+        supplier_models: dict[str, set[str]] = {}
+        for supplier_product in supplier_products:
+            models = supplier_models.setdefault(supplier_product.brand, set())
+            models.add(remove_brand_variations(supplier_product.model))
+
+        self.blocks: dict[str, tuple[dict[str, int], dict[str, int], "np.ndarray"]] = {}
+        for brand, block in index.brand_blocks.items():
+            if brand not in supplier_models:
+                continue
+            rows = sorted(supplier_models[brand])
+            cols = sorted({remove_brand_variations(index.store_products[idx].model) for idx in block})
+            # float64, чтобы значения совпадали с fuzz.ratio до последнего знака
+            scores = process.cdist(rows, cols, scorer=fuzz.ratio, dtype=np.float64, workers=workers)
+            STATS.count("cdist_cells", len(rows) * len(cols))
+            self.blocks[brand] = ({model: i for i, model in enumerate(rows)},
+                                  {model: j for j, model in enumerate(cols)}, scores)
+
+    def similarity(self, brand: str, model_1: str, model_2: str) -> float:
+        """То же, что `calculate_similarity`, но читает значение из матрицы бренда."""
+        model_1_clean = remove_brand_variations(model_1)
+        model_2_clean = remove_brand_variations(model_2)
+
+        if model_1_clean == model_2_clean:
+            return 100.0
+
+        block = self.blocks.get(brand)
+        if block is not None:
+            row_ids, col_ids, scores = block
+            i = row_ids.get(model_1_clean)
+            j = col_ids.get(model_2_clean)
+            if i is not None and j is not None:
+                return float(scores[i, j])
+
+        return calculate_similarity(model_1, model_2)
+
+    def for_brand(self, brand: str) -> Callable[[str, str], float]:
+        """Возвращает функцию схожести для товаров поставщика бренда `brand`."""
+        return partial(self.similarity, brand)
+
+
+# Модели считаются похожими (бонус вместо штрафа) при схожести выше порога. Опытным путем подобрано
+MODEL_SIMILARITY_THRESHOLD = 83
+
+def calculate_match_score(supplier_product: SupplierProduct, store_product: StoreProduct,
+                          common_keywords: int | None = None,
+                          similarity: Callable[[str, str], float] = calculate_similarity) -> float:
+    """
+    Считает баллы совпадения товара поставщика с товаром магазина.
+    `common_keywords` — заранее посчитанное число общих ключевых слов (например, из `KeywordIndex`).
+    `similarity` — функция схожести моделей (по умолчанию `calculate_similarity`).
+    """
+    if common_keywords is None:
+        common_keywords = len(frozenset(supplier_product.keyword_ids).intersection(store_product.keyword_ids))
+    score = common_keywords * 1.5  # 1.5 балла за каждое совпадение (раньше было 1)
+    # Цвета английского теперь мало в синонимах, поэтому все хорошо
+
+    # Полное совпадение модели
+    if supplier_product.model == store_product.model:
+        score += 30
+
+    # Полное совпадение бренда
+    if supplier_product.brand == store_product.brand:
+        score += 20
+
+        # Сравнение моделей по схожести (без учета бренда)
+        model_similarity = similarity(supplier_product.model, store_product.model)
+        if model_similarity > MODEL_SIMILARITY_THRESHOLD:
+            score += model_similarity / 5
+        else:
+            score -= 15
+
+    else:
+        score -= 50  # Штраф за разные бренды
+
+    # RAM и Storage дают очки, если оба присутствуют
+    if supplier_product.ram and store_product.ram and supplier_product.ram == store_product.ram:
+        score += 15
+    if supplier_product.storage and store_product.storage and supplier_product.storage == store_product.storage:
+        score += 15
 
+    # За схожесть унифицированного русского цвета + 3 балла
+    if supplier_product.color and supplier_product.color == store_product.color:
+        score += 3
+
+    return score
+
+def other_brand_score_bound(supplier_product: SupplierProduct) -> float:
+    """
+    Верхняя граница баллов для товара магазина другого бренда:
+    все ключевые слова, модель, RAM, Storage и цвет совпали, но есть штраф за бренд.
+    """
+    score = len(supplier_product.keyword_ids) * 1.5
+    score += 30
+    score -= 50
+    score += 15
+    score += 15
+    score += 3
+    return score
+
+def other_brand_block_bound(supplier_product: SupplierProduct, index: StoreIndex, brand: str) -> float:
+    """
+    Верхняя граница баллов для любого товара блока другого бренда: не больше ключевых слов, чем у самого
+    богатого словами товара блока, 30 за модель только если такая модель есть в блоке, и штраф за бренд.
+    """
+    score = min(len(supplier_product.keyword_ids), index.block_max_keywords[brand]) * 1.5
+    if (brand, supplier_product.model) in index.model_blocks:
+        score += 30
+    score -= 50
+    if supplier_product.ram:
+        score += 15
+    if supplier_product.storage:
+        score += 15
+    if supplier_product.color:
+        score += 3
+    return score
+
+def other_model_score_bound(supplier_product: SupplierProduct) -> float:
+    """
+    Верхняя граница баллов для товара магазина с другой моделью (того же или другого бренда):
+    все ключевые слова, бренд, RAM, Storage и цвет совпали, схожесть моделей максимальная (100 / 5),
+    но нет 30 баллов за полное совпадение модели. Другой бренд дает еще меньше (-50 вместо +40).
+    """
+    score = len(supplier_product.keyword_ids) * 1.5
+    score += 20
+    score += 100 / 5
+    if supplier_product.ram:
+        score += 15
+    if supplier_product.storage:
+        score += 15
+    if supplier_product.color:
+        score += 3
+    return score
+
+def find_best_match(supplier_product: SupplierProduct, store_products: list[StoreProduct],
+                    candidate_ids: list[int], overlap_counts: dict[int, int] | None = None,
+                    similarity: Callable[[str, str], float] = calculate_similarity,
+                    best: tuple[int | None, float] = (None, 0)) -> tuple[int | None, float]:
+    """
+    Возвращает номер лучшего товара магазина среди кандидатов и его баллы.
+    При равных баллах выигрывает товар, который раньше в каталоге, товары с баллами <= 0 не выбираются.
+    `best` — уже найденное лучшее совпадение (например, в блоке бренда), его нужно превзойти.
+    Метод ветвей и границ:
+    1. Для каждого кандидата считается верхняя граница баллов по дешевым слагаемым: схожесть моделей
+       считается максимальной (100 / 5), для другого бренда граница равна точным баллам.
+    2. Кандидаты обходятся по убыванию границы; схожесть считается, только если граница
+       может превзойти лучшие баллы (или сравняться с ними у товара раньше в каталоге).
+    3. Как только граница меньше лучших баллов, остальные кандидаты пропускаются.
+    Результат тот же, что у полного перебора.
+    """
+    best_id, best_score = best
+    supplier_keywords = frozenset(supplier_product.keyword_ids)
+    STATS.count("pairs_scored", len(candidate_ids))
+
+    # Самый горячий цикл, поэтому граница считается здесь, без вызова функции на каждую пару.
+    # Все слагаемые границы кратны 0.5 и считаются в float точно, а точные баллы отличаются
+    # только схожестью <= 100 / 5, поэтому граница никогда не меньше точных баллов
+    model, brand, ram, storage, color = (supplier_product.model, supplier_product.brand, supplier_product.ram,
+                                         supplier_product.storage, supplier_product.color)
+    keyword_count = len(supplier_keywords)
+    bounds: list[tuple[float, int, int]] = []
+    for idx in candidate_ids:
+        store_product = store_products[idx]
+        rest = 0
+        if model == store_product.model:
+            rest += 30
+        if brand == store_product.brand:
+            rest += 40  # 20 за бренд и не больше 100 / 5 за схожесть моделей
+        else:
+            rest -= 50
+        if ram and store_product.ram and ram == store_product.ram:
+            rest += 15
+        if storage and store_product.storage and storage == store_product.storage:
+            rest += 15
+        if color and color == store_product.color:
+            rest += 3
+
+        if overlap_counts is not None:
+            common_keywords = overlap_counts.get(idx, 0)
+        else:
+            # Пересечение ключевых слов — самая дорогая часть; сначала граница по размерам наборов
+            bound = min(keyword_count, len(store_product.keyword_ids)) * 1.5 + rest
+            if bound < best_score or (bound == best_score and (best_id is None or idx > best_id)):
+                continue
+            common_keywords = len(supplier_keywords.intersection(store_product.keyword_ids))
+
+        bound = common_keywords * 1.5 + rest
+        # Фильтрация по минимуму баллов
+        if bound > best_score or (best_id is not None and bound == best_score and idx < best_id):
+            bounds.append((-bound, idx, common_keywords))
+    bounds.sort()
+
+    evaluated = 0
+    for negative_bound, idx, common_keywords in bounds:
+        bound = -negative_bound
+        if bound < best_score:
+            break
+        if bound == best_score and (best_id is None or idx > best_id):
+            continue
+        score = calculate_match_score(supplier_product, store_products[idx], common_keywords, similarity)
+        evaluated += 1
+        if score > best_score or (best_id is not None and score == best_score and idx < best_id):
+            best_id = idx
+            best_score = score
+
+    STATS.count("pairs_fully_scored", evaluated)
+    return best_id, best_score
+
+def apply_storage_prediction(supplier_products: list[SupplierProduct]) -> None:
+    """
+    Предварительный проход: предсказывает объем памяти по модели для товаров без Storage.
+    Выполняется до сопоставления, чтобы баллы не зависели от порядка товаров магазина.
+    """
+    for supplier_product in supplier_products:
+        if not supplier_product.storage:
+            supplier_product.storage, supplier_product.model = predict_storage(supplier_product)
+
+def scoring_key(supplier_product: SupplierProduct) -> tuple:
+    """
+    Ключ из всех полей, от которых зависят баллы: бренд, модель, RAM, Storage, цвет и ключевые слова.
+    Номера ключевых слов действуют только внутри процесса, для хранения на диске есть `match_key`.
+    """
+    return (supplier_product.brand, supplier_product.model, supplier_product.ram, supplier_product.storage,
+            supplier_product.color, supplier_product.keyword_ids.tobytes())
+
+def group_offers(supplier_products: list[SupplierProduct]) -> tuple[list[SupplierProduct], list[int]]:
+    """
+    Группирует одинаковые после нормализации предложения (разные цена и поставщик) по `scoring_key`.
+    Возвращает (по одному товару на группу в порядке первого появления,
+    номер группы для каждого товара поставщика).
+    """
+    group_ids: dict[tuple, int] = {}
+    unique_products: list[SupplierProduct] = []
+    positions: list[int] = []
     for supplier_product in supplier_products:
-        best_match = None
-        best_score = 0
-
-        for store_product in store_products:
-            common_keywords = supplier_product.synonyms & store_product.synonyms
-            score = len(common_keywords) * 1.5  # 1.5 балла за каждое совпадение (раньше было 1)
-            # Цвета английского теперь мало в синонимах, поэтому все хорошо
-
-            # Полное совпадение модели
-            if supplier_product.model == store_product.model:
-                score += 30
-
-            # Полное совпадение бренда
-            if supplier_product.brand == store_product.brand:
-                score += 20
-
-                # Сравнение моделей по схожести (без учета бренда)
-                similarity = calculate_similarity(supplier_product.model, store_product.model)
-                if similarity > 83: # Опытным путем подобрано
-                    score += similarity / 5
-                else:
-                    score -= 15
-
-            else:
-                score -= 50  # Штраф за разные бренды
-
-            # RAM и Storage дают очки, если оба присутствуют
-            if not supplier_product.storage:
-                # Из-за гугл пикселя пытаююсь предсказать потенциальый объем внутренний памяти
-                for predicted_storage in ["64", "128", "256", "512", "1024"]:
-                    if predicted_storage in supplier_product.model:
-                        supplier_product.storage = int(predicted_storage)
-                        supplier_product.model = supplier_product.model.replace(predicted_storage, "").strip()
-                        break
-
-            if supplier_product.ram and store_product.ram and supplier_product.ram == store_product.ram:
-                score += 15
-            if supplier_product.storage and store_product.storage and supplier_product.storage == store_product.storage:
-                score += 15
-
-            # За схожесть унифицированного русского цвета + 3 балла
-            if supplier_product.color and supplier_product.color == store_product.color:
-                score += 3
-
-            # Фильтрация по минимуму баллов
-            if score > best_score:
-                best_match = store_product
-                best_score = score
-
-        if best_match:
-            matched_products.append(MatchedProduct(supplier_product, best_match, best_score))
+        key = scoring_key(supplier_product)
+        group_id = group_ids.get(key)
+        if group_id is None:
+            group_id = group_ids[key] = len(unique_products)
+            unique_products.append(supplier_product)
+        positions.append(group_id)
+    return unique_products, positions
+
+class StoreMatcher:
+    """
+    Каталог магазина, его индексы и настройки поиска, собранные один раз.
+    В параллельном режиме передается в каждый процесс один раз, а не с каждой задачей.
+    - `top_k` — полностью оценивать только `top_k` товаров с наибольшим числом общих слов (приближенно).
+    - `ngram_k` — сначала оценивать товары `ngram_k` ближайших моделей (`ModelNgramIndex`, приближенно).
+    - `batched_similarity` — считать схожесть моделей заранее (`BatchedSimilarity`) на `similarity_workers` ядрах.
+    - `vectorized` — считать баллы пачками в NumPy (`VectorEngine`).
+    Без `top_k` и `ngram_k` результат совпадает с полным перебором.
+    """
+    def __init__(self, store_products: list[StoreProduct], top_k: int | None = None,
+                 batched_similarity: bool = False, similarity_workers: int = -1, vectorized: bool = False,
+                 ngram_k: int | None = None) -> None:
+        if vectorized and (top_k or ngram_k):
+            raise ValueError("vectorized несовместим с top_k и ngram_k: векторный движок оценивает весь каталог")
+        if top_k and ngram_k:
+            raise ValueError("top_k и ngram_k — разные способы отбора кандидатов, задается один")
+        self.store_products = store_products
+        self.index = StoreIndex(store_products)
+        self.keyword_index = KeywordIndex(store_products) if top_k else None
+        # По индексу на блок бренда (модели без бренда у разных брендов похожи) и один на весь каталог
+        self.ngram_indexes: dict[str | None, ModelNgramIndex] = {}
+        if ngram_k:
+            self.ngram_indexes[None] = ModelNgramIndex(store_products, remove_brand_variations, ngram_k)
+            for brand, block in self.index.brand_blocks.items():
+                self.ngram_indexes[brand] = ModelNgramIndex(store_products, remove_brand_variations, ngram_k, block)
+        self.top_k = top_k
+        self.ngram_k = ngram_k
+        self.batched_similarity = batched_similarity
+        self.similarity_workers = similarity_workers
+        self.vectorized = vectorized
+        self.vector_engine = None
+        if vectorized:
+            # NumPy нужен только этому режиму
+            from vector_engine import VectorEngine
+            self.vector_engine = VectorEngine(store_products)
+
+    # Номера ключевых слов действуют только внутри процесса, поэтому индексы
+    # не передаются, а строятся заново в процессе-получателе
+    def __getstate__(self) -> tuple:
+        return (self.store_products, self.top_k, self.batched_similarity, self.similarity_workers, self.vectorized,
+                self.ngram_k)
+
+    def __setstate__(self, state: tuple) -> None:
+        self.__init__(*state)
+
+    def find_exact_match(self, supplier_product: SupplierProduct,
+                         similarity: Callable[[str, str], float] = calculate_similarity) -> tuple[int | None, float] | None:
+        """
+        Быстрый путь для товара, у которого есть точная копия в каталоге по (бренд, модель, RAM, Storage, цвет).
+        Оцениваются только товары той же модели; возвращает лучший из них или None, если ключа в каталоге нет.
+        Найденное окончательно, если его баллы выше `other_model_score_bound`: товары других моделей
+        теряют минимум 30 баллов за модель и не могут его превзойти. Иначе оно служит порогом для обычного поиска.
+        """
+        if exact_key(supplier_product) not in self.index.exact_keys:
+            STATS.count("exact_key_misses")
+            return None
+        STATS.count("exact_key_hits")
+        model_ids = self.index.model_block(supplier_product.brand, supplier_product.model)
+        return find_best_match(supplier_product, self.store_products, model_ids, similarity=similarity)
+
+    def find_match(self, supplier_product: SupplierProduct,
+                   similarity: Callable[[str, str], float] = calculate_similarity) -> tuple[int | None, float]:
+        """Возвращает номер лучшего товара магазина для товара поставщика и его баллы."""
+        store_products = self.store_products
+
+        if self.keyword_index is not None:
+            overlap_counts = self.keyword_index.overlap_counts(supplier_product.keyword_ids)
+            candidate_ids = self.keyword_index.top_candidates(overlap_counts, self.top_k)
+            return find_best_match(supplier_product, store_products, candidate_ids, overlap_counts, similarity)
+
+        if self.ngram_indexes:
+            ngram_index = self.ngram_indexes.get(supplier_product.brand, self.ngram_indexes[None])
+            candidate_ids = ngram_index.candidates(supplier_product.model)
+            best = find_best_match(supplier_product, store_products, candidate_ids, similarity=similarity)
+            best_id, best_score = best
+            if best_id is not None and similarity(supplier_product.model,
+                                                  store_products[best_id].model) > MODEL_SIMILARITY_THRESHOLD:
+                return best
+            # Похожей модели среди кандидатов нет: лучшее совпадение решают ключевые слова и характеристики,
+            # поэтому ищется как обычно, а найденное среди кандидатов служит порогом
+            STATS.count("ngram_fallbacks")
+        else:
+            best = self.find_exact_match(supplier_product, similarity)
+            if best is not None and best[1] > other_model_score_bound(supplier_product):
+                STATS.count("exact_key_resolved")
+                return best
+            best = best or (None, 0)
+
+        candidate_ids = self.index.block(supplier_product.brand)
+        best_id, best_score = find_best_match(supplier_product, store_products, candidate_ids, similarity=similarity,
+                                              best=best)
+
+        # Товар другого бренда может победить только при очень большом числе общих ключевых слов.
+        # Блоки других брендов проверяются по своей границе и отсекаются целиком, не глядя на товары;
+        # внутри оставшихся блоков лучшее совпадение передается как порог
+        if candidate_ids is not self.index.all_ids and other_brand_score_bound(supplier_product) >= best_score:
+            blocks = sorted(((other_brand_block_bound(supplier_product, self.index, brand), ids)
+                             for brand, ids in self.index.other_blocks(supplier_product.brand)),
+                            key=lambda block: -block[0])
+            for position, (bound, ids) in enumerate(blocks):
+                if bound < best_score:
+                    STATS.count("other_brand_blocks_skipped", len(blocks) - position)
+                    break
+                # Товар с равными баллами побеждает, только если он раньше в каталоге
+                if bound == best_score and (best_id is None or ids[0] > best_id):
+                    STATS.count("other_brand_blocks_skipped")
+                    continue
+                best_id, best_score = find_best_match(supplier_product, store_products, ids, similarity=similarity,
+                                                      best=(best_id, best_score))
+
+        return best_id, best_score
+
+    def match(self, supplier_products: list[SupplierProduct]) -> list[tuple[int | None, float]]:
+        """
+        Возвращает (номер товара магазина, баллы) для каждого товара поставщика по порядку.
+        Одинаковые после нормализации предложения оцениваются один раз (`group_offers`).
+        """
+        unique_products, positions = group_offers(supplier_products)
+        STATS.count("unique_offers", len(unique_products))
 
+        batched = None
+        if self.batched_similarity:
+            batched = BatchedSimilarity(unique_products, self.index, self.similarity_workers)
+
+        if self.vector_engine is not None:
+            similarity_for = (lambda product: batched.for_brand(product.brand)) if batched is not None \
+                else (lambda _: calculate_similarity)
+            unique_results = self.vector_engine.match(unique_products, similarity_for)
+            return [unique_results[group_id] for group_id in positions]
+
+        unique_results = []
+        for supplier_product in unique_products:
+            similarity = batched.for_brand(supplier_product.brand) if batched is not None else calculate_similarity
+            unique_results.append(self.find_match(supplier_product, similarity))
+        return [unique_results[group_id] for group_id in positions]
+
+    def use_single_thread(self) -> None:
+        """Для процесса-исполнителя: процессы уже заняли ядра, поэтому cdist работает в один поток."""
+        self.similarity_workers = 1
+
+class MultiStoreMatcher:
+    """
+    Несколько каталогов магазинов для одного прайс-листа: у каждого свой `StoreMatcher`
+    (блоки брендов и границы баллов внутри каталога), словарь ключевых слов общий.
+    Товары поставщиков разбираются и группируются (`group_offers`) один раз,
+    результат товара — кортеж (номер товара магазина или None, баллы) по каждому каталогу.
+    Подходит для `match_in_parallel` вместо `StoreMatcher`.
+    """
+    def __init__(self, matchers: list[StoreMatcher]) -> None:
+        self.matchers = matchers
+
+    def match(self, supplier_products: list[SupplierProduct]) -> list[tuple[tuple[int | None, float], ...]]:
+        unique_products, positions = group_offers(supplier_products)
+        per_catalog = [matcher.match(unique_products) for matcher in self.matchers]
+        unique_results = list(zip(*per_catalog)) if per_catalog else [()] * len(unique_products)
+        return [unique_results[group_id] for group_id in positions]
+
+    def use_single_thread(self) -> None:
+        for matcher in self.matchers:
+            matcher.use_single_thread()
+
+# Каталог процесса-исполнителя, задается один раз при запуске процесса
+_worker_matcher: StoreMatcher | MultiStoreMatcher | None = None
+
+def _init_worker(store_matcher: StoreMatcher | MultiStoreMatcher, collect_stats: bool = False) -> None:
+    global _worker_matcher
+    store_matcher.use_single_thread()
+    _worker_matcher = store_matcher
+    init_worker_stats(collect_stats)
+
+def _match_shard(supplier_products: list[SupplierProduct]) -> tuple[list[tuple[int | None, float]], dict | None]:
+    """Сопоставляет часть товаров и возвращает результаты вместе со счетчиками процесса (если они включены)."""
+    results = _worker_matcher.match(supplier_products)
+    return results, STATS.take_counters()
+
+def match_in_parallel(store_matcher: StoreMatcher | MultiStoreMatcher, supplier_products: list[SupplierProduct],
+                      workers: int) -> list:
+    """
+    Делит товары поставщиков на части и сопоставляет их в `workers` процессах.
+    Одинаковые предложения объединяются до деления, чтобы не оценивать их в разных процессах.
+    В процессах cdist работает в один поток (`use_single_thread`).
+    Результаты возвращаются в исходном порядке товаров.
+    """
+    unique_products, positions = group_offers(supplier_products)
+    shard_size = max(1, -(-len(unique_products) // (workers * 4)))  # По ~4 части на процесс для балансировки
+    shards = [unique_products[i:i + shard_size] for i in range(0, len(unique_products), shard_size)]
+
+    # Пул процессов нужен только при `workers` > 1, поэтому модуль загружается здесь
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(store_matcher, STATS.enabled)) as executor:
+        for shard_results, counters in executor.map(_match_shard, shards):
+            STATS.merge_counters(counters)
+            results.extend(shard_results)
+    return [results[group_id] for group_id in positions]
+
+def iter_store_matches(store_matcher: StoreMatcher, supplier_products: Iterable[SupplierProduct], workers: int = 1,
+                       batch_size: int = 1000) -> Iterator[tuple[SupplierProduct, int | None, float]]:
+    """
+    Сопоставляет поток товаров поставщиков пачками по `batch_size`, не собирая весь поток в память.
+    Выдает (товар поставщика, номер лучшего товара магазина или None, баллы) в исходном порядке.
+    При `workers` > 1 одновременно в работе не больше 2 пачек на процесс.
+    """
+    def batches() -> Iterator[list[SupplierProduct]]:
+        iterator = iter(supplier_products)
+        while batch := list(islice(iterator, batch_size)):
+            apply_storage_prediction(batch)
+            yield batch
+
+    if workers <= 1:
+        for batch in batches():
+            for supplier_product, (best_id, best_score) in zip(batch, store_matcher.match(batch)):
+                yield supplier_product, best_id, best_score
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    def finished(batch: list[SupplierProduct], future: "Future") -> Iterator[tuple[SupplierProduct, int | None, float]]:
+        results, counters = future.result()
+        STATS.merge_counters(counters)
+        for supplier_product, (best_id, best_score) in zip(batch, results):
+            yield supplier_product, best_id, best_score
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(store_matcher, STATS.enabled)) as executor:
+        pending: deque[tuple[list[SupplierProduct], "Future"]] = deque()
+        for batch in batches():
+            pending.append((batch, executor.submit(_match_shard, batch)))
+            while len(pending) > workers * 2 or (pending and pending[0][1].done()):
+                yield from finished(*pending.popleft())
+        while pending:
+            yield from finished(*pending.popleft())
+
+def match_key(supplier_product: SupplierProduct) -> tuple:
+    """
+    Ключ товара поставщика из всех полей, влияющих на сопоставление.
+    Цена и поставщик в ключ не входят.
+    """
+    return (supplier_product.brand, supplier_product.model, supplier_product.ram, supplier_product.storage,
+            supplier_product.color, tuple(sorted(supplier_product.synonyms)))
+
+def find_store_matches(supplier_products: list[SupplierProduct], store_products: list[StoreProduct],
+                       top_k: int | None = None, batched_similarity: bool = False,
+                       similarity_workers: int = -1, workers: int = 1,
+                       vectorized: bool = False, ngram_k: int | None = None) -> list[tuple[int | None, float]]:
+    """
+    Возвращает (номер лучшего товара магазина или None, баллы) для каждого товара поставщика по порядку.
+    Параметры те же, что у `match_supplier_to_store`.
+    """
+    apply_storage_prediction(supplier_products)
+
+    store_matcher = StoreMatcher(store_products, top_k, batched_similarity, similarity_workers, vectorized, ngram_k)
+    if workers > 1:
+        return match_in_parallel(store_matcher, supplier_products, workers)
+    return store_matcher.match(supplier_products)
+
+def find_multi_store_matches(supplier_products: list[SupplierProduct], catalogs: list[list[StoreProduct]],
+                             workers: int = 1, vectorized: bool = False, ngram_k: int | None = None,
+                             top_k: int | None = None, batched_similarity: bool = False,
+                             similarity_workers: int = -1) -> list[list[tuple[int | None, float]]]:
+    """
+    Сопоставляет товары поставщиков сразу с несколькими каталогами (`MultiStoreMatcher`).
+    Возвращает по списку (номер товара магазина или None, баллы) на каждый каталог, в порядке `catalogs`.
+    """
+    apply_storage_prediction(supplier_products)
+    multi_matcher = MultiStoreMatcher([StoreMatcher(store_products, top_k, batched_similarity, similarity_workers,
+                                                    vectorized, ngram_k)
+                                       for store_products in catalogs])
+    if workers > 1:
+        results = match_in_parallel(multi_matcher, supplier_products, workers)
+    else:
+        results = multi_matcher.match(supplier_products)
+    return [[result[catalog] for result in results] for catalog in range(len(catalogs))]
+
+def build_matched_products(supplier_products: list[SupplierProduct], store_products: list[StoreProduct],
+                           results: list[tuple[int | None, float]]) -> list[MatchedProduct]:
+    """Собирает `MatchedProduct` из результатов `find_store_matches`, пропуская товары без совпадения."""
+    matched_products: list[MatchedProduct] = []
+    for supplier_product, (best_id, best_score) in zip(supplier_products, results):
+        if best_id is not None:
+            matched_products.append(MatchedProduct(supplier_product, store_products[best_id], best_score))
     return matched_products
+
+def match_supplier_to_store(supplier_products: list[SupplierProduct], store_products: list[StoreProduct],
+                            top_k: int | None = None, batched_similarity: bool = False,
+                            similarity_workers: int = -1, workers: int = 1,
+                            vectorized: bool = False, ngram_k: int | None = None) -> list[MatchedProduct]:
+    """
+    Сопоставляет товары поставщиков с товарами магазина.
+    - Использует ключевые слова (`synonyms`) для поиска наиболее похожих товаров.
+    - Учитывает совпадение RAM, Storage, цвета и модели.
+    Параметры поиска — как у `StoreMatcher`, при `workers` > 1 товары сопоставляются в нескольких процессах.
+    """
+    results = find_store_matches(supplier_products, store_products, top_k, batched_similarity,
+                                 similarity_workers, workers, vectorized, ngram_k)
+    return build_matched_products(supplier_products, store_products, results)
@@ -0,0 +1,121 @@
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Hashable, Iterable
+
+# Сколько записей по умолчанию хранит `MatchMemo`
+DEFAULT_MEMO_SIZE = 1_000_000
+
+# Сколько ключей передается в один запрос `IN (...)` (у SQLite есть предел на число параметров)
+QUERY_BATCH = 500
+
+class LRUCache:
+    """
+    Словарь ограниченного размера: при переполнении удаляется запись, к которой дольше всего не обращались.
+    Используется для кэшей внутри процесса, которые иначе растут вместе с числом разных строк.
+    """
+    def __init__(self, maxsize: int) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize должен быть положительным")
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default=None):
+        """Значение по ключу (запись становится самой свежей) или `default`."""
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def __setitem__(self, key: Hashable, value) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+class MatchMemo:
+    """
+    Результаты сопоставления прошлых запусков в SQLite: (номер и код товара магазина, баллы)
+    по хэшу нормализованного товара поставщика (`match_key_digest`).
+    - Записи разных каталогов и версий кода подсчета баллов хранятся рядом, но видны только
+      при том же отпечатке (`fingerprint`), поэтому смена каталога не требует очистки файла.
+    - Размер ограничен `max_entries`: лишние записи удаляются по давности последнего использования,
+      поэтому записи устаревших каталогов со временем вытесняются сами.
+    - Товары без совпадения тоже запоминаются (номер None).
+    """
+    def __init__(self, path: Path, fingerprint: str, max_entries: int = DEFAULT_MEMO_SIZE) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries должен быть положительным")
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS matches ("
+                " fingerprint TEXT NOT NULL, key BLOB NOT NULL, store_id INTEGER, store_code TEXT,"
+                " score REAL NOT NULL, used_at REAL NOT NULL, PRIMARY KEY (fingerprint, key))")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS matches_used_at ON matches (used_at)")
+
+    def __enter__(self) -> "MatchMemo":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    def lookup(self, keys: Iterable[bytes]) -> dict[bytes, tuple[int | None, str | None, float]]:
+        """Возвращает {ключ: (номер товара магазина или None, код, баллы)} для найденных ключей и отмечает их использование."""
+        keys = list(dict.fromkeys(keys))
+        found: dict[bytes, tuple[int | None, str | None, float]] = {}
+        for start in range(0, len(keys), QUERY_BATCH):
+            batch = keys[start:start + QUERY_BATCH]
+            rows = self._connection.execute(
+                f"SELECT key, store_id, store_code, score FROM matches"
+                f" WHERE fingerprint = ? AND key IN ({', '.join('?' * len(batch))})",
+                (self.fingerprint, *batch))
+            for key, store_id, store_code, score in rows:
+                found[key] = (store_id, store_code, score)
+
+        now = time.time()
+        with self._connection:
+            self._connection.executemany("UPDATE matches SET used_at = ? WHERE fingerprint = ? AND key = ?",
+                                         ((now, self.fingerprint, key) for key in found))
+        return found
+
+    def store(self, results: dict[bytes, tuple[int | None, str | None, float]]) -> None:
+        """Запоминает результаты и удаляет самые давно использованные записи сверх `max_entries`."""
+        now = time.time()
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO matches (fingerprint, key, store_id, store_code, score, used_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                ((self.fingerprint, key, store_id, store_code, score, now)
+                 for key, (store_id, store_code, score) in results.items()))
+            self.evict()
+
+    def evict(self) -> int:
+        """Удаляет записи сверх `max_entries`, начиная с самых давно использованных. Возвращает их число."""
+        excess = len(self) - self.max_entries
+        if excess <= 0:
+            return 0
+        self._connection.execute(
+            "DELETE FROM matches WHERE rowid IN (SELECT rowid FROM matches ORDER BY used_at LIMIT ?)", (excess,))
+        return excess
@@ -0,0 +1,110 @@
+from collections import deque
+from typing import Iterable
+
+from store_processing import BRAND_SYNONYMS
+
+class MultiPatternMatcher:
+    """
+    Автомат Ахо-Корасик: находит все строки набора, входящие в текст, за один проход по тексту.
+    """
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self.patterns = set(patterns)
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[tuple[str, ...]] = [()]
+
+        # Бор из всех строк (пустая строка входит в любой текст, ее учитываем отдельно)
+        self._always = ("",) if "" in self.patterns else ()
+        for pattern in self.patterns:
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] += (pattern,)
+
+        # Суффиксные ссылки обходом в ширину, выходы наследуются по ним.
+        # Переходы по суффиксным ссылкам сразу сворачиваются в таблицу переходов (ДКА),
+        # чтобы на каждый символ текста приходился один поиск в словаре.
+        self._delta: list[dict[str, int]] = [dict(self._goto[0])] + [{} for _ in self._goto[1:]]
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            fail_delta = self._delta[self._fail[state]]
+            self._delta[state] = {**fail_delta, **self._goto[state]}
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = fail_delta.get(ch, 0)
+                self._fail[next_state] = fail
+                self._output[next_state] += self._output[fail]
+
+    def find_all(self, text: str) -> set[str]:
+        """Возвращает все строки набора, которые встречаются в тексте."""
+        delta, output = self._delta, self._output
+        found = set(self._always)
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+# Обратный словарь вариация -> бренд (при повторах побеждает бренд, который раньше в BRAND_SYNONYMS)
+BRAND_BY_VARIATION: dict[str, str] = {
+    variation: brand for brand, variations in reversed(BRAND_SYNONYMS.items()) for variation in variations
+}
+
+# Названия брендов в порядке приоритета: их всего ~20, и проверка `in` на уровне C
+# быстрее прохода автомата по тексту
+BRAND_NAMES = tuple(BRAND_SYNONYMS)
+
+class Normalizer:
+    """
+    Таблицы для нормализации брендов и цветов, скомпилированные один раз из `BRAND_SYNONYMS`
+    и словаря цветов магазина.
+    - Вариации брендов и синонимы цветов ищутся по обратным словарям.
+    - Цвета в тексте ищутся одним проходом автомата, а не перебором всех синонимов.
+    - Приоритет как у перебора: цвет, который раньше в словаре, а внутри цвета — более длинный синоним
+      (при равной длине — первый по алфавиту).
+    """
+    def __init__(self, store_color_synonyms: dict[str, set[str]]) -> None:
+        self.color_by_synonym: dict[str, str] = {}
+        self._color_priority: dict[str, tuple[int, int, str]] = {}
+        for order, (russian_color, synonyms) in enumerate(store_color_synonyms.items()):
+            for synonym in synonyms:
+                self.color_by_synonym.setdefault(synonym, russian_color)
+                self._color_priority.setdefault(synonym, (order, -len(synonym), synonym))
+        self._color_matcher = MultiPatternMatcher(self._color_priority)
+
+    @staticmethod
+    def normalize_brand(brand: str) -> str:
+        """Приводит бренд к стандартному написанию из BRAND_SYNONYMS."""
+        return BRAND_BY_VARIATION.get(brand, brand)
+
+    @staticmethod
+    def detect_brand(model: str) -> str | None:
+        """Определяет бренд, название которого входит в модель (первый по порядку BRAND_SYNONYMS)."""
+        for brand in BRAND_NAMES:
+            if brand in model:
+                return brand
+        return None
+
+    def map_color(self, supplier_color: str) -> str | None:
+        """Сопоставляет цвет поставщика со словарем магазина."""
+        return self.color_by_synonym.get(supplier_color.lower())
+
+    def extract_color(self, text: str) -> tuple[str, str | None]:
+        """Ищет цвет в названии и приводит его к стандартному формату магазина."""
+        lower_text = text.lower()
+        found = self._color_matcher.find_all(lower_text)
+        if not found:
+            return text, None
+        color = min(found, key=self._color_priority.__getitem__)
+        return lower_text.replace(color, "").strip(), self.color_by_synonym[color]
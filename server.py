@@ -0,0 +1,197 @@
+import argparse
+import csv
+import json
+import os
+import socketserver
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+from cache import DEFAULT_CACHE_DIR, load_store_catalog
+from keywords import KeywordVocabulary, use_vocabulary
+from matcher import StoreMatcher, apply_storage_prediction
+from normalizer import Normalizer
+from store_processing import StoreProduct
+from supplier_processing import SupplierProduct, parse_supplier_rows
+
+class CatalogState:
+    """
+    Все, что собирается по файлу магазина: словарь ключевых слов, словарь цветов, нормализатор и индекс.
+    Словарь ключевых слов свой у каждого каталога, поэтому слова прежнего каталога уходят вместе с ним.
+    """
+    def __init__(self, signature: tuple[int, int], vocabulary: KeywordVocabulary, color_synonyms: dict[str, set[str]],
+                 store_products: list[StoreProduct]) -> None:
+        self.signature = signature
+        self.vocabulary = vocabulary
+        self.color_synonyms = color_synonyms
+        self.store_products = store_products
+        self.normalizer = Normalizer(color_synonyms)
+        self.matcher = StoreMatcher(store_products)
+        self.loaded_at = time.time()
+
+class MatchingService:
+    """
+    Каталог магазина, загруженный один раз и готовый к сопоставлению.
+    - Перед каждым запросом проверяется, не изменился ли файл магазина (размер и время изменения).
+    - Новый каталог собирается полностью и только потом подменяет старый, поэтому запрос
+      видит либо старый, либо новый каталог целиком. Если файл не удалось разобрать
+      (например, он еще дописывается), остается старый каталог.
+    - Нормализация как в `load_and_process_supplier_data`, баллы как в `match_supplier_to_store`.
+    - Словарь ключевых слов каталога после загрузки не пополняется, поэтому память не растет от запроса к запросу.
+    """
+    def __init__(self, store_path: Path, cache_dir: Path = DEFAULT_CACHE_DIR) -> None:
+        self.store_path = Path(store_path)
+        self.cache_dir = cache_dir
+        self.state = self._load()
+
+    def _signature(self) -> tuple[int, int]:
+        stat = os.stat(self.store_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> CatalogState:
+        signature = self._signature()
+        with use_vocabulary(KeywordVocabulary()) as vocabulary:
+            color_synonyms, store_products = load_store_catalog(self.store_path, self.cache_dir)
+        return CatalogState(signature, vocabulary, color_synonyms, store_products)
+
+    def reload_if_changed(self) -> bool:
+        """Перезагружает каталог, если файл магазина изменился. Возвращает True, если каталог обновлен."""
+        try:
+            if self._signature() == self.state.signature:
+                return False
+            state = self._load()
+        except (OSError, ValueError, IndexError, csv.Error) as error:
+            print(f"⚠️ Каталог магазина не перезагружен, используется прежний: {error}")
+            return False
+        self.state = state
+        print(f"🔄 Каталог магазина перезагружен: {len(state.store_products)} товаров")
+        return True
+
+    def match_rows(self, rows: list[list[str]]) -> list[dict]:
+        """
+        Сопоставляет строки прайс-листа `[название, поставщик]` с каталогом.
+        Строки-заголовки брендов и мусор, как и в файле, товаров не дают.
+        Слова запроса, которых нет в каталоге, попадают во временное дополнение словаря и уходят вместе с запросом:
+        с товарами магазина они не совпадают, а в баллах учитывается только их число.
+        """
+        state = self.state
+        with use_vocabulary(state.vocabulary.overlay()):
+            supplier_products = list(parse_supplier_rows(rows, state.color_synonyms, state.normalizer))
+        apply_storage_prediction(supplier_products)
+        results = state.matcher.match(supplier_products)
+        return [self._describe(supplier_product, state.store_products, best_id, best_score)
+                for supplier_product, (best_id, best_score) in zip(supplier_products, results)]
+
+    @staticmethod
+    def _describe(supplier_product: SupplierProduct, store_products: list[StoreProduct],
+                  best_id: int | None, best_score: float) -> dict:
+        match = None
+        if best_id is not None:
+            store_product = store_products[best_id]
+            match = {"code": store_product.code, "name": store_product.orig_name, "score": best_score}
+        return {
+            "name": supplier_product.name,
+            "brand": supplier_product.brand,
+            "model": supplier_product.model,
+            "ram": supplier_product.ram,
+            "storage": supplier_product.storage,
+            "color": supplier_product.color,
+            "price": supplier_product.price,
+            "supplier": supplier_product.supplier_name,
+            "match": match,
+        }
+
+def parse_request_rows(body: bytes, content_type: str) -> list[list[str]]:
+    """
+    Строки из тела запроса:
+    - JSON `{"rows": [["название", "поставщик"], "название;поставщик", ...]}`;
+    - иначе текст, по строке прайс-листа на строку, поставщик через `;`.
+    """
+    if content_type.startswith("application/json"):
+        rows = [next(csv.reader([item], delimiter=";")) if isinstance(item, str) else [str(value) for value in item]
+                for item in json.loads(body)["rows"]]
+    else:
+        rows = list(csv.reader(body.decode("utf-8").splitlines(), delimiter=";"))
+    # Строка без поставщика тоже сопоставляется
+    return [row if len(row) >= 2 else row + [""] for row in rows if row]
+
+class MatchRequestHandler(BaseHTTPRequestHandler):
+    """
+    - `POST /match` — сопоставить строки прайс-листа (см. `parse_request_rows`).
+    - `GET /health` — состояние каталога.
+    """
+    service: MatchingService
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path != "/health":
+            self._send_json(404, {"error": "not found"})
+            return
+        self.service.reload_if_changed()
+        state = self.service.state
+        self._send_json(200, {"store_file": str(self.service.store_path), "store_products": len(state.store_products),
+                              "loaded_at": state.loaded_at})
+
+    def do_POST(self) -> None:
+        if self.path != "/match":
+            self._send_json(404, {"error": "not found"})
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            rows = parse_request_rows(body, self.headers.get("Content-Type", ""))
+        except (ValueError, KeyError, TypeError) as error:
+            self._send_json(400, {"error": f"некорректный запрос: {error}"})
+            return
+
+        self.service.reload_if_changed()
+        start = time.perf_counter()
+        results = self.service.match_rows(rows)
+        self._send_json(200, {"results": results, "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)})
+
+    def address_string(self) -> str:
+        # У Unix-сокета нет адреса клиента
+        return self.client_address[0] if self.client_address else "unix"
+
+class UnixHTTPServer(socketserver.UnixStreamServer):
+    pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервис сопоставления строк прайс-листа с каталогом магазина")
+    parser.add_argument("store_filename", help="CSV-файл с товарами магазина")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix-socket", type=Path, default=None, help="Слушать Unix-сокет вместо TCP-порта")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR,
+                        help=f"Папка для кэша обработанного каталога магазина (по умолчанию {DEFAULT_CACHE_DIR})")
+    args = parser.parse_args()
+
+    MatchRequestHandler.service = MatchingService(Path(args.store_filename), args.cache_dir)
+    print(f"Каталог магазина загружен: {len(MatchRequestHandler.service.state.store_products)} товаров")
+
+    # Запросы обрабатываются по одному: словарь ключевых слов каталога и кэши сопоставления общие для процесса
+    if args.unix_socket is not None:
+        args.unix_socket.unlink(missing_ok=True)
+        server = UnixHTTPServer(str(args.unix_socket), MatchRequestHandler)
+        print(f"✅ Сервис слушает {args.unix_socket}")
+    else:
+        server = HTTPServer((args.host, args.port), MatchRequestHandler)
+        print(f"✅ Сервис слушает http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix_socket is not None:
+            args.unix_socket.unlink(missing_ok=True)
+
+if __name__ == '__main__':
+    main()
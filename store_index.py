@@ -0,0 +1,154 @@
+from collections import Counter
+import heapq
+import math
+from typing import Callable, Iterable, Iterator
+
+from memo import LRUCache
+from store_processing import StoreProduct
+
+# Длина символьных n-грамм для `ModelNgramIndex`
+NGRAM_SIZE = 3
+
+def exact_key(product: StoreProduct) -> tuple:
+    """Составной ключ (бренд, модель, RAM, Storage, цвет); у товара поставщика те же поля."""
+    return product.brand, product.model, product.ram, product.storage, product.color
+
+class StoreIndex:
+    """
+    Индекс товаров магазина, строится один раз перед сопоставлением.
+    - Делит каталог на блоки по нормализованному бренду.
+    - Хранит составные ключи товаров (`exact_key`) и блоки по (бренд, модель)
+      для быстрого пути точного совпадения.
+    - Для каждого блока бренда хранит наибольшее число ключевых слов у его товаров,
+      чтобы отсекать блоки других брендов целиком по верхней границе баллов.
+    - Номера товаров в блоках идут в порядке каталога, чтобы сохранить выбор первого лучшего совпадения.
+    """
+    def __init__(self, store_products: list[StoreProduct]) -> None:
+        self.store_products = store_products
+        self.all_ids = list(range(len(store_products)))
+        self.brand_blocks: dict[str, list[int]] = {}
+        self.block_max_keywords: dict[str, int] = {}
+        self.model_blocks: dict[tuple[str, str], list[int]] = {}
+        self.exact_keys: set[tuple] = set()
+        for idx, store_product in enumerate(store_products):
+            self.brand_blocks.setdefault(store_product.brand, []).append(idx)
+            self.block_max_keywords[store_product.brand] = max(self.block_max_keywords.get(store_product.brand, 0),
+                                                               len(store_product.keyword_ids))
+            self.model_blocks.setdefault((store_product.brand, store_product.model), []).append(idx)
+            self.exact_keys.add(exact_key(store_product))
+
+    def __len__(self) -> int:
+        return len(self.store_products)
+
+    def block(self, brand: str | None) -> list[int]:
+        """
+        Возвращает номера товаров-кандидатов для бренда.
+        Если бренд неизвестен или его нет в каталоге, возвращает весь каталог.
+        """
+        if brand is None or brand not in self.brand_blocks:
+            return self.all_ids
+        return self.brand_blocks[brand]
+
+    def model_block(self, brand: str, model: str) -> list[int]:
+        """Возвращает номера товаров того же бренда и той же модели (любые RAM, Storage и цвет)."""
+        return self.model_blocks.get((brand, model), [])
+
+    def other_blocks(self, brand: str) -> Iterator[tuple[str, list[int]]]:
+        """Выдает (бренд, номера товаров) для блоков других брендов (широкий блок по частям)."""
+        return ((block_brand, ids) for block_brand, ids in self.brand_blocks.items() if block_brand != brand)
+
+class KeywordIndex:
+    """
+    Обратный индекс ключевых слов: номер слова -> номера товаров магазина, у которых оно есть в `synonyms`.
+    - Строится по результату `generate_keywords`.
+    - Позволяет за один проход по ключевым словам товара поставщика посчитать число общих слов со всем каталогом.
+    """
+    def __init__(self, store_products: list[StoreProduct]) -> None:
+        self.postings: dict[int, list[int]] = {}
+        for idx, store_product in enumerate(store_products):
+            for keyword_id in store_product.keyword_ids:
+                self.postings.setdefault(keyword_id, []).append(idx)
+
+    def overlap_counts(self, keyword_ids: Iterable[int]) -> Counter[int]:
+        """Возвращает {номер товара магазина -> число общих ключевых слов} для товаров с хотя бы одним общим словом."""
+        counts: Counter[int] = Counter()
+        for keyword_id in keyword_ids:
+            ids = self.postings.get(keyword_id)
+            if ids:
+                counts.update(ids)
+        return counts
+
+    @staticmethod
+    def top_candidates(counts: Counter[int], top_k: int) -> list[int]:
+        """
+        Возвращает `top_k` товаров с наибольшим числом общих слов.
+        При равенстве выигрывает товар, который раньше в каталоге; результат отсортирован по порядку каталога.
+        """
+        top = heapq.nsmallest(top_k, counts.items(), key=lambda item: (-item[1], item[0]))
+        return sorted(idx for idx, _ in top)
+
+def char_ngrams(text: str, n: int = NGRAM_SIZE) -> Counter[str]:
+    """Символьные n-граммы строки; пробелы по краям дают n-граммы начала и конца слова и коротким моделям."""
+    padded = f" {text} "
+    return Counter(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+
+class ModelNgramIndex:
+    """
+    Индекс символьных n-грамм по моделям магазина без бренда для поиска ближайших моделей без перебора каталога.
+    Строится по всему каталогу или по его части `ids` (например, по блоку бренда).
+    - Каждая различная модель — вектор TF-IDF по n-граммам, близость моделей — косинус.
+    - Обратный индекс n-грамма -> [(номер модели, вес)]: обходятся только модели с общими n-граммами,
+      а частые n-граммы весят мало.
+    - Возвращает товары `top_k` ближайших моделей, дальше их полностью оценивает `find_best_match`
+      (схожесть через fuzz.ratio с прежним порогом).
+    """
+    def __init__(self, store_products: list[StoreProduct], clean: Callable[[str], str], top_k: int,
+                 ids: Iterable[int] | None = None) -> None:
+        self.top_k = top_k
+        self.clean = clean
+        model_ids: dict[str, int] = {}
+        self.model_products: list[list[int]] = []
+        for idx in range(len(store_products)) if ids is None else ids:
+            model_id = model_ids.setdefault(clean(store_products[idx].model), len(model_ids))
+            if model_id == len(self.model_products):
+                self.model_products.append([])
+            self.model_products[model_id].append(idx)
+
+        model_ngrams = [char_ngrams(model) for model in model_ids]
+        document_frequency: Counter[str] = Counter()
+        for ngrams in model_ngrams:
+            document_frequency.update(ngrams.keys())
+        self.idf = {ngram: math.log((1 + len(model_ngrams)) / (1 + count)) + 1
+                    for ngram, count in document_frequency.items()}
+
+        self.postings: dict[str, list[tuple[int, float]]] = {}
+        for model_id, ngrams in enumerate(model_ngrams):
+            weights = {ngram: count * self.idf[ngram] for ngram, count in ngrams.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+            for ngram, weight in weights.items():
+                self.postings.setdefault(ngram, []).append((model_id, weight / norm))
+
+        # Одна и та же модель поставщика встречается у многих предложений
+        self._cache = LRUCache(1 << 14)
+
+    def nearest_models(self, model: str) -> list[int]:
+        """Номера `top_k` моделей с наибольшим косинусом к модели поставщика (без бренда)."""
+        scores: Counter[int] = Counter()
+        for ngram, count in char_ngrams(model).items():
+            postings = self.postings.get(ngram)
+            if postings:
+                weight = count * self.idf[ngram]
+                for model_id, model_weight in postings:
+                    scores[model_id] += weight * model_weight
+        # Норма запроса одна для всех моделей и на порядок не влияет
+        top = heapq.nsmallest(self.top_k, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [model_id for model_id, _ in top]
+
+    def candidates(self, model: str) -> list[int]:
+        """Номера товаров магазина с ближайшими моделями в порядке каталога (пусто, если общих n-грамм нет)."""
+        model = self.clean(model)
+        cached = self._cache.get(model)
+        if cached is None:
+            cached = sorted(idx for model_id in self.nearest_models(model) for idx in self.model_products[model_id])
+            self._cache[model] = cached
+        return cached
@@ -1,22 +1,37 @@
-import csv
 from pathlib import Path
 import re
-from turtle import color
+import time
+from typing import Iterable
 
-from csv_processing import find_delimiter
+from csv_processing import MappedCSV
+from instrumentation import STATS
+from keywords import current_vocabulary, intern_optional
 
 class StoreProduct:
+    # Без `__dict__` на каждый объект; ключевые слова хранятся номерами из словаря `vocabulary`
+    # (общий `KEYWORDS`, если товар создан не внутри `use_vocabulary`)
+    __slots__ = ("orig_name", "name", "keyword_ids", "vocabulary", "code", "ram", "storage", "brand", "model", "color")
+
     def __init__(self, orig_name: str, name: str, brand: str, model: str, synonyms: set[str], code: str,
                  ram: int | None = None, storage: int | None = None, color: str | None = None) -> None:
         self.orig_name = orig_name
         self.name = name
+        self.vocabulary = current_vocabulary()
         self.synonyms = synonyms
         self.code = code
         self.ram = ram
         self.storage = storage
-        self.brand = brand
-        self.model = model
-        self.color = color
+        self.brand = intern_optional(brand)
+        self.model = intern_optional(model)
+        self.color = intern_optional(color)
+
+    @property
+    def synonyms(self) -> set[str]:
+        return self.vocabulary.decode(self.keyword_ids)
+
+    @synonyms.setter
+    def synonyms(self, synonyms: Iterable[str]) -> None:
+        self.keyword_ids = self.vocabulary.encode(synonyms)
 
     def __repr__(self) -> str:
         return f"StoreProduct(orig_name='{self.orig_name}', name='{self.name}', brand='{self.brand}'," \
@@ -37,6 +52,13 @@ class StoreProduct:
             "color": self.color
         }
 
+    # `__dict__` переопределен методом, поэтому для pickle (процессы, кэш) состояние задается явно
+    def __getstate__(self) -> dict:
+        return self.__dict__()
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(**{**state, "synonyms": set(state["synonyms"])})
+
 BRAND_SYNONYMS = {
         "xiaomi": ["redmi", "poco", "сяоми", "ксиаоми", "xiaomi"],
         "samsung": ["galaxy", "tab", "самсунг", "гелекси", "гэлэкси", "samsung"],
@@ -67,113 +89,136 @@ def get_memory_synonyms(ram: int) -> set[str]:
         synonyms.update(["1 tb", "1тб", "1 тб", "1tb"])
     return synonyms
 
+def _store_brand(brand: str) -> str:
+    """Бренд строки магазина по `BRAND_SYNONYMS`: словарь проходится целиком, побеждает последнее совпадение."""
+    for orig_brand, variations in BRAND_SYNONYMS.items():
+        if brand in variations:
+            brand = orig_brand
+    return brand
+
+# Вариация -> бренд для строк магазина, посчитано один раз вместо прохода по `BRAND_SYNONYMS` на каждую строку
+# (бренд не из вариаций не меняется)
+STORE_BRAND_BY_VARIATION: dict[str, str] = {
+    variation: _store_brand(variation) for variations in BRAND_SYNONYMS.values() for variation in variations
+}
+
+# Группы похожих цветов (унификация названий)
+COLOR_MAPPING = {
+    # Серебро
+    "серебристый": "серебро",
+    "серебряный": "серебро",
+    "серебрянный": "серебро",
+    "silver": "серебро",
+    "platinum": "серебро",
+    "titanium silver": "серебро",
+    "еребристый": "серебро",
+    
+    # Серый
+    "cерый": "серый", # Здесь первая буква английская с, а не русская с
+    "серый космос": "серый",
+    "космос": "серый",
+    "графит": "серый",
+    "графитовый": "серый",
+    "серый": "серый",
+    "титан": "серый",
+    "титановый": "серый",
+    "gray": "серый",
+    "grey": "серый",
+    "graphite": "серый",
+    "space gray": "серый",
+    "titanium gray": "серый",
+
+    # Черный
+    "черный": "черный",
+    "obsidian": "черный",
+    "midnight": "черный",
+    "ночь": "черный",
+    "onyx": "черный",
+
+    # Зеленый
+    "зеленый": "зеленый",
+    "green": "зеленый",
+    "olive": "зеленый",
+
+    # Фиолетовый
+    "фиолетовый": "фиолетовый",
+    "purple": "фиолетовый",
+    "lavender": "фиолетовый",
+    "violet": "фиолетовый",
+
+    # Синий
+    "синий": "синий",
+    "голубой": "синий",
+    "blue": "синий",
+    "navy": "синий",
+    "ультрамарин": "синий",
+}
+
+COLOR_REGEX = re.compile(r"([А-Яа-я\-]+)\s\(([\s\w]+)\)")  # Регулярка для "Темно-Синий (Dark Blue)"
+
+def add_color_synonyms(color_synonyms: dict[str, set[str]], name: str, color: str) -> None:
+    """Добавляет в словарь цвета строки магазина: значения столбцов `Наименование` и `Цвет`."""
+    name = name.lower().replace('ё', 'е').replace('-', ' ').strip()
+    color_from_column = color.lower().replace('ё', 'е').replace('-', ' ').strip() if color else None
+
+    # Ищем основной цвет в `Наименование`
+    primary_color = None
+    match = COLOR_REGEX.search(name)
+    if match:
+        primary_color = match.group(1).strip()  # Берём русский цвет
+        english_color = match.group(2).strip()  # Берём английский синоним
+
+    # Если не найдено в `Наименование`, берём из `Цвет`
+    if not primary_color and color_from_column:
+        primary_color = color_from_column
+        english_color = None
+
+    # Если даже `Цвет` пустой, пропускаем строку
+    if not primary_color:
+        return
+
+    # Унифицируем цвет (заменяем на стандартный)
+    unified_primary_color = COLOR_MAPPING.get(primary_color, primary_color)
+
+    # Создаём группу синонимов
+    if unified_primary_color not in color_synonyms:
+        color_synonyms[unified_primary_color] = set()
+    color_synonyms[unified_primary_color].add(primary_color)  # Сам цвет
+
+    # Добавляем английский цвет (если есть)
+    if english_color:
+        unified_english_color = COLOR_MAPPING.get(english_color, unified_primary_color)
+        color_synonyms[unified_english_color].add(english_color)
+
+    # Добавляем цвет из `Цвет`, если он отличается
+    if color_from_column:
+        unified_column_color = COLOR_MAPPING.get(color_from_column, color_from_column)
+        if unified_column_color != unified_primary_color and unified_column_color not in color_synonyms.keys():  # Если цвет реально другой
+            color_synonyms[unified_primary_color].add(unified_column_color)
+
 def generate_color_synonyms(path: Path) -> dict[str, set[str]]:
     """Генерирует синонимы для цветов, используя цвет из `Наименование` как основной."""
-    color_regex = re.compile(r"([А-Яа-я\-]+)\s\(([\s\w]+)\)")  # Регулярка для "Темно-Синий (Dark Blue)"
-    delimiter = find_delimiter(path)
-
-    # Группы похожих цветов (унификация названий)
-    COLOR_MAPPING = {
-        # Серебро
-        "серебристый": "серебро",
-        "серебряный": "серебро",
-        "серебрянный": "серебро",
-        "silver": "серебро",
-        "platinum": "серебро",
-        "titanium silver": "серебро",
-        "еребристый": "серебро",
-        
-        # Серый
-        "cерый": "серый", # Здесь первая буква английская с, а не русская с
-        "серый космос": "серый",
-        "космос": "серый",
-        "графит": "серый",
-        "графитовый": "серый",
-        "серый": "серый",
-        "титан": "серый",
-        "титановый": "серый",
-        "gray": "серый",
-        "grey": "серый",
-        "graphite": "серый",
-        "space gray": "серый",
-        "titanium gray": "серый",
-
-        # Черный
-        "черный": "черный",
-        "obsidian": "черный",
-        "midnight": "черный",
-        "ночь": "черный",
-        "onyx": "черный",
-
-        # Зеленый
-        "зеленый": "зеленый",
-        "green": "зеленый",
-        "olive": "зеленый",
-
-        # Фиолетовый
-        "фиолетовый": "фиолетовый",
-        "purple": "фиолетовый",
-        "lavender": "фиолетовый",
-        "violet": "фиолетовый",
-
-        # Синий
-        "синий": "синий",
-        "голубой": "синий",
-        "blue": "синий",
-        "navy": "синий",
-        "ультрамарин": "синий",
-    }
-
-    with open(path, encoding='utf-8') as fp:
-        reader = csv.reader(fp, delimiter=delimiter)
-        header = next(reader)
-        color_index = header.index('Цвет')
-        name_index = header.index("Наименование")
+    with MappedCSV(path) as mapped:
+        reader = mapped.iter_rows()
+        columns = StoreColumns(next(reader))
 
         # Основной словарь {основной русский цвет → множество синонимов}
         color_synonyms = {}
-
         for row in reader:
-            name = row[name_index].lower().replace('ё', 'е').replace('-', ' ').strip()
-            color_from_column = row[color_index].lower().replace('ё', 'е').replace('-', ' ').strip() if row[color_index] else None
-
-            # Ищем основной цвет в `Наименование`
-            primary_color = None
-            match = color_regex.search(name)
-            if match:
-                primary_color = match.group(1).strip()  # Берём русский цвет
-                english_color = match.group(2).strip()  # Берём английский синоним
-
-            # Если не найдено в `Наименование`, берём из `Цвет`
-            if not primary_color and color_from_column:
-                primary_color = color_from_column
-                english_color = None
-
-            # Если даже `Цвет` пустой, пропускаем строку
-            if not primary_color:
-                continue
-
-            # Унифицируем цвет (заменяем на стандартный)
-            unified_primary_color = COLOR_MAPPING.get(primary_color, primary_color)
-
-            # Создаём группу синонимов
-            if unified_primary_color not in color_synonyms:
-                color_synonyms[unified_primary_color] = set()
-            color_synonyms[unified_primary_color].add(primary_color)  # Сам цвет
-
-            # Добавляем английский цвет (если есть)
-            if english_color:
-                unified_english_color = COLOR_MAPPING.get(english_color, unified_primary_color)
-                color_synonyms[unified_english_color].add(english_color)
-
-            # Добавляем цвет из `Цвет`, если он отличается
-            if color_from_column:
-                unified_column_color = COLOR_MAPPING.get(color_from_column, color_from_column)
-                if unified_column_color != unified_primary_color and unified_column_color not in color_synonyms.keys():  # Если цвет реально другой
-                    color_synonyms[unified_primary_color].add(unified_column_color)
+            add_color_synonyms(color_synonyms, row[columns.name], row[columns.color])
 
         return color_synonyms
 
+def merge_color_synonyms(color_maps: Iterable[dict[str, set[str]]]) -> dict[str, set[str]]:
+    """
+    Объединяет словари цветов нескольких каталогов: синонимы одного цвета складываются,
+    порядок цветов — по первому появлению (он задает приоритет при поиске цвета).
+    """
+    merged: dict[str, set[str]] = {}
+    for color_synonyms in color_maps:
+        for color, synonyms in color_synonyms.items():
+            merged.setdefault(color, set()).update(synonyms)
+    return merged
 
 def generate_keywords(name: str, color_synonyms: dict[str, set[str]], ram: int | None = None, storage: int | None = None, color: str | None = None) -> set:
     """Генерирует ключевые слова для товара"""
@@ -219,72 +264,120 @@ def generate_keywords(name: str, color_synonyms: dict[str, set[str]], ram: int |
 
     return keywords
 
+class StoreColumns:
+    """Номера нужных столбцов CSV магазина, определяются один раз по заголовку."""
+    def __init__(self, header: list[str]) -> None:
+        self.name = header.index('Наименование')
+        self.ram = header.index('Оперативная память (Gb)')
+        self.storage = header.index('Встроенная память')
+        self.color = header.index('Цвет')
+        self.brand = header.index("Производитель")
+        self.model = header.index("Модель")
+        self.code = header.index("Внешний код")
+
+def parse_store_row(row: list[str], columns: StoreColumns) -> tuple[StoreProduct, str, str | None] | None:
+    """
+    Первый проход по строке магазина: все, что не зависит от словаря цветов.
+    Возвращает (товар без цвета и ключевых слов, название для поиска цвета, цвет из столбца)
+    или None для строки без названия.
+    """
+    orig_name = row[columns.name]
+    product_name = row[columns.name].lower().replace("pro +", "pro+").replace("pro+", "pro plus").replace('-', '')
+    if product_name == '':
+        STATS.count("store_rows_skipped")
+        return None
+
+    # Условно poco и xiaomi, у них родитель xiaomi, но poco есть в модели
+    brand = row[columns.brand].lower()
+    model = row[columns.model].lower().replace("pro +", "pro+").replace("pro+", "pro plus")
+    brand = STORE_BRAND_BY_VARIATION.get(brand, brand)
+    if brand not in model:
+        model = f"{brand} {model}" # Унифицированный формат модели
+    product = StoreProduct(orig_name, product_name, brand, model, set(), row[columns.code])
+
+    if brand == "xiaomi" and "note" in model and "redmi" not in model:
+        model = model.replace("xiaomi", "xiaomi redmi")  # Автоматически добавляем Redmi, если модель xiaomi note..
+        product_name = product_name.replace("xiaomi", "xiaomi redmi")
+
+    ram = row[columns.ram]
+    if ram:
+        product.ram = int(ram)
+
+    # Получаем цвет из таблицы
+    color_russian = row[columns.color]
+    color_russian = color_russian.lower().replace('ё', 'е').replace('-', ' ').strip() if color_russian else None
+
+    # Добавляем объем памяти
+    storage = row[columns.storage]
+    if storage:
+        if any(x in ["tb", "тб"] for x in storage.lower()):
+            product.storage = 1024
+        else:
+            number = 0
+            for id, ch in enumerate(storage):
+                if not ch.isdigit():
+                    number = int(storage[:id])
+                    break
+            product.storage = int(number)
+
+    return product, product_name, color_russian
+
+def finish_store_product(product: StoreProduct, product_name: str, color_russian: str | None,
+                         color_synonyms: dict[str, set[str]]) -> StoreProduct:
+    """Второй проход по товару магазина: цвет и ключевые слова по готовому словарю цветов."""
+    # Проверяем, есть ли цвет в названии товара
+    found_color = None
+    for color in color_synonyms.keys():
+        if color in product_name:
+            found_color = color
+            break
+    # Если цвет в столбце "Цвет" не совпадает с названием
+    if color_russian and found_color and color_russian != found_color:
+        # Используем цвет из "Наименование", так как он вероятно более точный
+        color = found_color
+    product.color = color
+
+    # Генерируем ключевые слова через универсальную функцию
+    if STATS.enabled:
+        start = time.perf_counter()
+        product.synonyms = generate_keywords(product_name, color_synonyms, product.ram, product.storage, color)
+        STATS.add_time("store_keywords", time.perf_counter() - start)
+    else:
+        product.synonyms = generate_keywords(product_name, color_synonyms, product.ram, product.storage, color)
+    return product
+
+def load_store_data(path: Path) -> tuple[dict[str, set[str]], list[StoreProduct]]:
+    """
+    Читает CSV магазина один раз и возвращает словарь синонимов цветов и товары.
+    - Столбцы определяются один раз по заголовку.
+    - Файл отображается в память один раз (`MappedCSV`): и для разделителя, и для строк.
+    - Словарь цветов собирается в том же проходе, что и разбор товаров.
+    - Цвет и ключевые слова товаров требуют готового словаря, поэтому считаются
+      вторым проходом по уже разобранным товарам, без повторного чтения файла.
+    """
+    color_synonyms: dict[str, set[str]] = {}
+    parsed: list[tuple[StoreProduct, str, str | None]] = []
+    with MappedCSV(path) as mapped:
+        reader = mapped.iter_rows()
+        columns = StoreColumns(next(reader))
+        for row in reader:
+            add_color_synonyms(color_synonyms, row[columns.name], row[columns.color])
+            parsed_row = parse_store_row(row, columns)
+            if parsed_row is not None:
+                parsed.append(parsed_row)
+
+    products = [finish_store_product(product, product_name, color_russian, color_synonyms)
+                for product, product_name, color_russian in parsed]
+    return color_synonyms, products
+
 def load_and_process_store_data(path: Path, color_synonyms) -> list[StoreProduct]:
     """Генерирует синонимы для товаров"""
-    delimiter = find_delimiter(path)
-    with open(path, encoding='utf-8') as fp:
-        reader = csv.reader(fp, delimiter=delimiter)
-        header = next(reader)
-        product_index = header.index('Наименование')
-        ram_index = header.index('Оперативная память (Gb)')
-        storage_index = header.index('Встроенная память')
-        color_index = header.index('Цвет')
+    with MappedCSV(path) as mapped:
+        reader = mapped.iter_rows()
+        columns = StoreColumns(next(reader))
         products: list[StoreProduct] = list()
         for row in reader:
-            orig_name = row[product_index]
-            product_name = row[product_index].lower().replace("pro +", "pro+").replace("pro+", "pro plus").replace('-', '')
-            if product_name == '':
-                continue
-            
-            # Условно poco и xiaomi, у них родитель xiaomi, но poco есть в модели
-            brand = row[header.index("Производитель")].lower()
-            model = row[header.index("Модель")].lower().replace("pro +", "pro+").replace("pro+", "pro plus")
-            for orig_brand, variations in BRAND_SYNONYMS.items():
-                if brand in variations:
-                    brand = orig_brand
-            if brand not in model:
-                model = f"{brand} {model}" # Унифицированный формат модели
-            product = StoreProduct(orig_name, product_name, brand, model, set(), row[header.index("Внешний код")])
-
-            if brand == "xiaomi" and "note" in model and "redmi" not in model:
-                model = model.replace("xiaomi", "xiaomi redmi")  # Автоматически добавляем Redmi, если модель xiaomi note..
-                product_name = product_name.replace("xiaomi", "xiaomi redmi")
-
-            ram = row[ram_index]
-            if ram:
-                product.ram = int(ram)
-
-            # Получаем цвет из таблицы
-            color_russian = row[color_index]
-            color_russian = color_russian.lower().replace('ё', 'е').replace('-', ' ').strip() if color_russian else None
-
-            # Проверяем, есть ли цвет в названии товара
-            found_color = None
-            for color in color_synonyms.keys():
-                if color in product_name:
-                    found_color = color
-                    break
-            # Если цвет в столбце "Цвет" не совпадает с названием
-            if color_russian and found_color and color_russian != found_color:
-                # Используем цвет из "Наименование", так как он вероятно более точный
-                color = found_color
-            product.color = color
-            
-            # Добавляем объем памяти
-            storage = row[storage_index]
-            if storage:
-                if any(x in ["tb", "тб"] for x in storage.lower()):
-                    product.storage = 1024
-                else:
-                    number = 0
-                    for id, ch in enumerate(storage):
-                        if not ch.isdigit():
-                            number = int(storage[:id])
-                            break
-                    product.storage = int(number)
-
-            # Генерируем ключевые слова через универсальную функцию
-            product.synonyms = generate_keywords(product_name, color_synonyms, product.ram, product.storage, color)
-
-            products.append(product)
+            parsed_row = parse_store_row(row, columns)
+            if parsed_row is not None:
+                products.append(finish_store_product(*parsed_row, color_synonyms))
         return products
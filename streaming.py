@@ -0,0 +1,126 @@
+import math
+import struct
+import tempfile
+from collections import Counter
+from statistics import StatisticsError
+from typing import Iterator
+
+class MatchSpool:
+    """
+    Временный файл с совпадениями в компактном двоичном виде.
+    - Запись: номер товара магазина, баллы, цена и номер поставщика (24 байта).
+    - Имена поставщиков хранятся в памяти один раз.
+    - Во время записи считается гистограмма баллов по целой части, по ней медиана
+      находится точно за один дополнительный проход по файлу (см. `median`).
+    - Совпадения, добавленные после `mark`, можно отбросить (`rollback`), например товары файла поставщика,
+      который не удалось дочитать.
+    """
+    RECORD = struct.Struct("<IdqI")
+    BUFFER_SIZE = 1 << 16
+
+    def __init__(self, directory: str | None = None) -> None:
+        self._file = tempfile.TemporaryFile(dir=directory)
+        self._buffer = bytearray()
+        self._supplier_ids: dict[str, int] = {}
+        self.supplier_names: list[str] = []
+        self.histogram: Counter[int] = Counter()
+        self.count = 0
+
+    def __enter__(self) -> "MatchSpool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def append(self, store_id: int, score: float, price: int, supplier_name: str) -> None:
+        """Добавляет совпадение в файл."""
+        supplier_id = self._supplier_ids.get(supplier_name)
+        if supplier_id is None:
+            supplier_id = self._supplier_ids[supplier_name] = len(self.supplier_names)
+            self.supplier_names.append(supplier_name)
+
+        self._buffer += self.RECORD.pack(store_id, score, price, supplier_id)
+        if len(self._buffer) >= self.BUFFER_SIZE:
+            self._flush()
+
+        self.histogram[math.floor(score)] += 1
+        self.count += 1
+
+    def _flush(self) -> None:
+        self._file.write(self._buffer)
+        self._buffer.clear()
+
+    def mark(self) -> int:
+        """Отметка текущего конца файла для `rollback`."""
+        return self.count
+
+    def rollback(self, mark: int) -> int:
+        """Отбрасывает совпадения, добавленные после отметки `mark`. Возвращает их число."""
+        self._flush()
+        offset = mark * self.RECORD.size
+        self._file.seek(offset)
+        dropped = self._file.read()
+        for _, score, _, _ in self.RECORD.iter_unpack(dropped):
+            self.histogram[math.floor(score)] -= 1
+        self.histogram = +self.histogram  # Пустые корзины не должны попадать в `median`
+        self._file.seek(offset)
+        self._file.truncate()
+        self.count = mark
+        return len(dropped) // self.RECORD.size
+
+    def __iter__(self) -> Iterator[tuple[int, float, int, str]]:
+        """Читает совпадения по порядку: (номер товара магазина, баллы, цена, поставщик)."""
+        self._flush()
+        self._file.seek(0)
+        record_size = self.RECORD.size
+        chunk_size = record_size * 4096
+        while chunk := self._file.read(chunk_size):
+            for store_id, score, price, supplier_id in self.RECORD.iter_unpack(chunk):
+                yield store_id, score, price, self.supplier_names[supplier_id]
+        self._file.seek(0, 2)
+
+    def _value_at_ranks(self, ranks: list[int]) -> dict[int, float]:
+        """
+        Находит значения баллов на позициях `ranks` в отсортированном порядке.
+        1. По гистограмме определяется целочисленная корзина каждой позиции.
+        2. Один проход по файлу считает различные значения только в этих корзинах.
+        Память зависит от числа различных баллов в корзине, а не от числа совпадений.
+        """
+        bucket_ranks: dict[int, list[tuple[int, int]]] = {}  # корзина -> [(позиция, позиция внутри корзины)]
+        seen = 0
+        remaining = sorted(ranks)
+        for bucket in sorted(self.histogram):
+            size = self.histogram[bucket]
+            while remaining and remaining[0] < seen + size:
+                rank = remaining.pop(0)
+                bucket_ranks.setdefault(bucket, []).append((rank, rank - seen))
+            seen += size
+
+        values: dict[int, Counter[float]] = {bucket: Counter() for bucket in bucket_ranks}
+        for _, score, _, _ in self:
+            bucket_values = values.get(math.floor(score))
+            if bucket_values is not None:
+                bucket_values[score] += 1
+
+        result: dict[int, float] = {}
+        for bucket, wanted in bucket_ranks.items():
+            seen = 0
+            for value in sorted(values[bucket]):
+                seen += values[bucket][value]
+                for rank, local_rank in wanted:
+                    if rank not in result and local_rank < seen:
+                        result[rank] = value
+        return result
+
+    def median(self) -> float:
+        """Точная медиана баллов, как `statistics.median` по всем совпадениям."""
+        n = self.count
+        if n == 0:
+            raise StatisticsError("no median for empty data")
+        if n % 2 == 1:
+            return self._value_at_ranks([n // 2])[n // 2]
+        values = self._value_at_ranks([n // 2 - 1, n // 2])
+        return (values[n // 2 - 1] + values[n // 2]) / 2
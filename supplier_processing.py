@@ -1,24 +1,41 @@
 import csv
-from locale import normalize
-from os import name
+import glob
 from pathlib import Path
 import re
+import time
+from typing import Iterable, Iterator
 
-from csv_processing import find_delimiter
-from store_processing import BRAND_SYNONYMS, generate_keywords
+from csv_processing import MappedCSV, read_rows
+from instrumentation import STATS, init_worker_stats
+from keywords import current_vocabulary, intern_optional
+from normalizer import Normalizer
+from store_processing import generate_keywords
 
 class SupplierProduct:
+    # Без `__dict__` на каждый объект; ключевые слова хранятся номерами из словаря `vocabulary`
+    # (общий `KEYWORDS`, если товар создан не внутри `use_vocabulary`)
+    __slots__ = ("model", "supplier_name", "price", "ram", "storage", "color", "name", "keyword_ids", "vocabulary", "brand")
+
     def __init__(self, name: str, brand: str, model: str, supplier_name: str, synonyms: set[str],
                  price: int, ram: int | None = None, storage: int | None = None, color: str | None = None):
         self.model = model
-        self.supplier_name = supplier_name
+        self.supplier_name = intern_optional(supplier_name)
         self.price = price
         self.ram = ram
         self.storage = storage
-        self.color = color
+        self.color = intern_optional(color)
         self.name = name
+        self.vocabulary = current_vocabulary()
         self.synonyms = synonyms
-        self.brand = brand
+        self.brand = intern_optional(brand)
+
+    @property
+    def synonyms(self) -> set[str]:
+        return self.vocabulary.decode(self.keyword_ids)
+
+    @synonyms.setter
+    def synonyms(self, synonyms: Iterable[str]) -> None:
+        self.keyword_ids = self.vocabulary.encode(synonyms)
     
     def __repr__(self):
         return f"SupplierProduct(name='{self.name}', model='{self.model}', brand='{self.brand}', supplier_name='{self.supplier_name}', " \
@@ -37,13 +54,22 @@ class SupplierProduct:
             "brand": self.brand
         }
 
+    # `__dict__` переопределен методом, поэтому для pickle (процессы, кэш) состояние задается явно
+    def __getstate__(self) -> dict:
+        return self.__dict__()
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(**{**state, "synonyms": set(state["synonyms"])})
+
+
+# Заголовок бренда: без кириллицы и цены, со странными разделителями с двух сторон (например, "📱SAMSUNG📱")
+BRAND_HEADER_REGEX = re.compile(r"^(?!.*[а-яА-Я]+)(?!.*\d+\s?[₽$€])[\W]+\s*([\w\d\s]+?)\s*[\W]+$")
 
 def extract_brand_or_model(text):
     """
     Извлекает бренд или модель из строки, если нет кириллических символов, цены и имеет странные разделители в двух сторонах.
     """
-    pattern = re.compile(r"^(?!.*[а-яА-Я]+)(?!.*\d+\s?[₽$€])[\W]+\s*([\w\d\s]+?)\s*[\W]+$")
-    match = pattern.match(text)
+    match = BRAND_HEADER_REGEX.match(text)
 
     if match:
         return match.group(1).strip().lower()
@@ -77,109 +103,261 @@ def extract_memory(text: str):
     return text, "", None, None
 
 def map_supplier_color_to_store(supplier_color: str, store_color_synonyms: dict[str, set[str]]) -> str | None:
-    """Сопоставляет цвет поставщика со словарем магазина."""""
-    supplier_color = supplier_color.lower()
-    for russian_color, synonyms in store_color_synonyms.items():
-        if supplier_color in synonyms:
-            return russian_color
-    return None
+    """
+    Сопоставляет цвет поставщика со словарем магазина.
+    Для множества строк лучше один раз создать `Normalizer` и вызывать `map_color`.
+    """
+    return Normalizer(store_color_synonyms).map_color(supplier_color)
 
 def extract_color(text: str, store_color_synonyms: dict[str, set[str]]) -> tuple[str, str | None]:
-    """Ищет цвет в названии и приводит его к стандартному формату магазина."""
-    for russian_color, synonyms in store_color_synonyms.items():
-        # В приоритете более длинные цвета, так как black и black stormy могут быть в тексте
-        sorted_synonyms = sorted(synonyms, key=len, reverse=True)
-        for color in sorted_synonyms:
-            if color in text.lower():
-                return text.lower().replace(color, "").strip(), russian_color
-    return text, None
+    """
+    Ищет цвет в названии и приводит его к стандартному формату магазина.
+    В приоритете более длинные цвета, так как black и black stormy могут быть в тексте.
+    Для множества строк лучше один раз создать `Normalizer` и вызывать `extract_color`.
+    """
+    return Normalizer(store_color_synonyms).extract_color(text)
 
 def normalize_brand(brand: str) -> str:
     """Приводит бренд к стандартному написанию из BRAND_SYNONYMS."""
-    for key_brand, variations in BRAND_SYNONYMS.items():
-        if brand in variations:
-            return key_brand
-    return brand
+    return Normalizer.normalize_brand(brand)
 
 def detect_brand_from_model(model: str) -> str | None:
     """Определяет бренд из модели, используя BRAND_SYNONYMS."""
-    for brand in BRAND_SYNONYMS:
-        if brand in model:
-            return brand
-    return None  # Если бренд не найден
+    return Normalizer.detect_brand(model)
+
+def clean_product_name(text: str) -> str:
+    """Приводит название из строки прайс-листа к нижнему регистру и единому написанию "pro plus"."""
+    return text.strip().lower().replace("pro + ", "pro+ ").replace("pro+ ", "pro plus ").replace('-','')
+
+def row_brand(row: list[str], normalizer: Normalizer) -> str | None:
+    """
+    Бренд, который строка задает как текущий для следующих строк (заголовок бренда или бренд в названии),
+    или None, если строка текущий бренд не меняет.
+    """
+    if len(row) < 2:
+        return None
+    product_name = clean_product_name(row[0])
+    match = extract_brand_or_model(product_name)
+    if match:
+        return normalizer.normalize_brand(match)
+    return normalizer.detect_brand(product_name)
+
+def parse_supplier_rows(rows: Iterable[list[str]], store_color_synonyms: dict[str, set[str]],
+                        normalizer: Normalizer | None = None, current_brand: str | None = None) -> Iterator[SupplierProduct]:
+    """
+    Обрабатывает строки прайс-листа поставщиков по одной и выдает нормализованные товары.
+    - Определяет текущий бренд (например, "📱SAMSUNG📱").
+    - Извлекает модель, цену, RAM, Storage, цвет.
+    - Приводит цвет к формату магазина через словарь `store_color_synonyms`.
+    `normalizer` — заранее собранный `Normalizer` для того же словаря (чтобы не собирать его на каждый вызов).
+    `current_brand` — текущий бренд перед первой строкой (для продолжения файла с середины).
+    """
+    if normalizer is None:
+        normalizer = Normalizer(store_color_synonyms)
+    for row in rows:
+        if len(row) < 2:
+            STATS.count("supplier_rows_short")
+            continue
+
+        product_name = clean_product_name(row[0])
+        supplier_name = row[1].strip()
+
+        # Проверяем, является ли строка заголовком бренда
+        match = extract_brand_or_model(product_name)
+        if match:
+            current_brand = normalizer.normalize_brand(match)  # Запоминаем бренд
+            STATS.count("supplier_brand_headers")
+            continue
+        
+        detected_brand = normalizer.detect_brand(product_name)
+
+        # Если модель уже содержит какой-то бренд, используем его как `current_brand`
+        if detected_brand:
+            current_brand = detected_brand
+
+        # Извлекаем цену
+        model, price = extract_price(product_name)
+
+        if price is None or '[' in model:
+            STATS.count("supplier_rows_junk")
+            continue  # Пропускаем мусор
+
+        # Извлекаем RAM и Storage и приводит к единому формату
+        model, replace_ram_storage, ram, storage = extract_memory(model)
+        product_name = model # Обновляем название товара к унифицированному
+        model = model.replace(replace_ram_storage, "")  # Убираем RAM и Storage из модели
+        # Отделяем цвет (если есть)
+        model, supplier_color = normalizer.extract_color(model)
 
-def load_and_process_supplier_data(file_path, store_color_synonyms):
+        # Очищаем модель и имя
+        model = normalize_model(model)
+        product_name = normalize_model(product_name)
+
+        # Если бренд найден ранее, добавляем его к модели при условии, что в имени нет любого другого бренда
+        if current_brand:
+            current_brand = normalizer.normalize_brand(current_brand)
+
+            if current_brand not in model:
+                model = f"{current_brand} {model}"
+            if current_brand not in product_name:
+                product_name = f"{current_brand} {product_name}"
+
+        if current_brand == "xiaomi" and "note" in model and "redmi" not in model:
+            model = model.replace("xiaomi", "xiaomi redmi")  # Автоматически добавляем Redmi, если модель xiaomi note..
+            product_name = product_name.replace("xiaomi", "xiaomi redmi")
+
+        product_name = ' '.join(product_name.split()) # Убираем лишние пробелы
+        model = ' '.join(model.split()) # Убираем лишние пробелы
+
+        # Генерируем ключевые слова
+        if STATS.enabled:
+            start = time.perf_counter()
+            keywords = generate_keywords(product_name, store_color_synonyms, ram, storage, supplier_color)
+            STATS.add_time("supplier_keywords", time.perf_counter() - start)
+            STATS.counters["supplier_products"] += 1
+        else:
+            keywords = generate_keywords(product_name, store_color_synonyms, ram, storage, supplier_color)
+
+        # Выдаем обработанный товар
+        yield SupplierProduct(product_name, current_brand, model,
+                              supplier_name, keywords, price, ram, storage, supplier_color)
+
+def iter_supplier_products(file_path, store_color_synonyms) -> Iterator[SupplierProduct]:
+    """Читает прайс-лист поставщиков частями, не держа весь файл в памяти."""
+    with MappedCSV(file_path) as mapped:
+        yield from parse_supplier_rows(mapped.iter_rows(), store_color_synonyms)
+
+# Меньше этого размера части файла не имеет смысла разбирать в отдельных процессах
+MIN_CHUNK_SIZE = 1 << 20
+
+def _parse_supplier_chunk(file_path: Path, start: int, end: int, delimiter: str,
+                          store_color_synonyms: dict[str, set[str]]) -> tuple:
+    """
+    Разбирает часть прайс-листа в процессе-исполнителе.
+    Текущий бренд в начале части неизвестен, поэтому строки до первой строки, задающей бренд,
+    возвращаются неразобранными. Возвращает (эти строки, товары остальных строк,
+    бренд после последней строки части или None, если ни одна строка его не задает, счетчики процесса).
+    """
+    rows = read_rows(file_path, start, end, delimiter)
+    normalizer = Normalizer(store_color_synonyms)
+    first = next((i for i, row in enumerate(rows) if row_brand(row, normalizer) is not None), len(rows))
+    last_brand = next((brand for row in reversed(rows[first:]) if (brand := row_brand(row, normalizer)) is not None),
+                      None)
+    products = list(parse_supplier_rows(rows[first:], store_color_synonyms, normalizer))
+    return rows[:first], products, last_brand, STATS.take_counters()
+
+def load_and_process_supplier_data(file_path, store_color_synonyms, workers: int = 1) -> list[SupplierProduct]:
     """
     Загружает, очищает и обрабатывает данные поставщиков.
     - Определяет текущий бренд (например, "📱SAMSUNG📱").
     - Извлекает модель, цену, RAM, Storage, цвет.
     - Приводит цвет к формату магазина через словарь `store_color_synonyms`.
+    - При `workers` > 1 большой файл делится на части (`MappedCSV.chunks`), которые разбираются в процессах.
+      Строки в начале части, идущие до первого заголовка бренда или бренда в названии, дожидаются
+      бренда с конца предыдущей части и разбираются в основном процессе, поэтому результат
+      совпадает с последовательным разбором.
     """
-    delimeter = find_delimiter(file_path)
-    supplier_data: list[SupplierProduct] = []
+    with MappedCSV(file_path) as mapped:
+        delimiter = mapped.delimiter
+        bounds = mapped.chunks(min(workers * 4, mapped.size // MIN_CHUNK_SIZE)) if workers > 1 else [(0, mapped.size)]
+        if len(bounds) == 1:
+            return list(parse_supplier_rows(mapped.rows(), store_color_synonyms))
+
+    # Пул процессов нужен только при `workers` > 1, поэтому модуль загружается здесь
+    from concurrent.futures import ProcessPoolExecutor
+
+    normalizer = Normalizer(store_color_synonyms)
+    supplier_products: list[SupplierProduct] = []
     current_brand = None
-    with open(file_path, encoding="utf-8") as f:
-        reader = csv.reader(f, delimiter=delimeter)
-        for row in reader:
-            if len(row) < 2:
-                continue
-
-            product_name = row[0].strip().lower().replace("pro + ", "pro+ ").replace("pro+ ", "pro plus ").replace('-','')
-            supplier_name = row[1].strip()
-
-            # Проверяем, является ли строка заголовком бренда
-            match = extract_brand_or_model(product_name)
-            if match:
-                current_brand = normalize_brand(match)  # Запоминаем бренд
-                continue
-            
-            detected_brand = detect_brand_from_model(product_name)
-
-            # Если модель уже содержит какой-то бренд, используем его как `current_brand`
-            if detected_brand:
-                current_brand = detected_brand
-
-            # Извлекаем цену
-            model, price = extract_price(product_name)
-
-            if price is None or '[' in model:
-                continue  # Пропускаем мусор
-
-            # Извлекаем RAM и Storage и приводит к единому формату
-            model, replace_ram_storage, ram, storage = extract_memory(model)
-            product_name = model # Обновляем название товара к унифицированному
-            model = model.replace(replace_ram_storage, "")  # Убираем RAM и Storage из модели
-            # Отделяем цвет (если есть)
-            model, supplier_color = extract_color(model, store_color_synonyms)
-
-            # Очищаем модель и имя
-            model = normalize_model(model)
-            product_name = normalize_model(product_name)
-
-            # Если бренд найден ранее, добавляем его к модели при условии, что в имени нет любого другого бренда
-            if current_brand:
-                for orig_brand, variations in BRAND_SYNONYMS.items():
-                    if current_brand in variations:
-                        current_brand = orig_brand
-                        break
-
-                if current_brand not in model:
-                    model = f"{current_brand} {model}"
-                if current_brand not in product_name:
-                    product_name = f"{current_brand} {product_name}"
-
-            if current_brand == "xiaomi" and "note" in model and "redmi" not in model:
-                model = model.replace("xiaomi", "xiaomi redmi")  # Автоматически добавляем Redmi, если модель xiaomi note..
-                product_name = product_name.replace("xiaomi", "xiaomi redmi")
-
-            product_name = ' '.join(product_name.split()) # Убираем лишние пробелы
-            model = ' '.join(model.split()) # Убираем лишние пробелы
-
-            # Генерируем ключевые слова
-            keywords = generate_keywords(product_name, store_color_synonyms, ram, storage, supplier_color)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_stats,
+                             initargs=(STATS.enabled,)) as executor:
+        chunks = executor.map(_parse_supplier_chunk, *zip(*[(file_path, start, end, delimiter, store_color_synonyms)
+                                                             for start, end in bounds]))
+        for prefix_rows, products, last_brand, counters in chunks:
+            STATS.merge_counters(counters)
+            supplier_products.extend(parse_supplier_rows(prefix_rows, store_color_synonyms, normalizer, current_brand))
+            supplier_products.extend(products)
+            if last_brand is not None:
+                current_brand = last_brand
+    return supplier_products
+
+# Ошибки, из-за которых пропускается один файл прайс-листа, а не весь запуск
+FILE_ERRORS = (OSError, UnicodeError, csv.Error, ValueError, IndexError)
+
+def expand_supplier_paths(spec: str | Path) -> list[Path]:
+    """
+    Превращает аргумент командной строки в список файлов поставщиков:
+    папка — все `.csv` в ней, шаблон (`prices/*.csv`) — подходящие файлы, иначе — сам файл.
+    Файлы отсортированы, чтобы порядок товаров не зависел от файловой системы.
+    """
+    path = Path(spec)
+    if path.is_dir():
+        return sorted(child for child in path.iterdir() if child.is_file() and child.suffix.lower() == ".csv")
+    if any(ch in str(spec) for ch in "*?["):
+        return sorted(Path(match) for match in glob.glob(str(spec)) if Path(match).is_file())
+    return [path]
+
+def _load_supplier_file(file_path: Path, store_color_synonyms: dict[str, set[str]], workers: int = 1
+                        ) -> tuple[list[SupplierProduct], str | None]:
+    """Загружает один файл: (товары, текст ошибки или None)."""
+    try:
+        return load_and_process_supplier_data(file_path, store_color_synonyms, workers), None
+    except FILE_ERRORS as error:
+        return [], f"{type(error).__name__}: {error}"
 
-            # Добавляем обработанный товар
-            supplier_data.append(SupplierProduct(product_name, current_brand, model,
-                                                 supplier_name, keywords, price, ram, storage, supplier_color))
+def _load_supplier_file_in_worker(file_path: Path, store_color_synonyms: dict[str, set[str]]
+                                  ) -> tuple[list[SupplierProduct], str | None, dict | None]:
+    """То же в процессе-исполнителе, вместе со счетчиками процесса (если они включены)."""
+    products, error = _load_supplier_file(file_path, store_color_synonyms)
+    return products, error, STATS.take_counters()
 
-    return supplier_data
+def load_supplier_files(paths: list[Path], store_color_synonyms: dict[str, set[str]],
+                        workers: int = 1) -> tuple[list[SupplierProduct], list[tuple[Path, str]]]:
+    """
+    Загружает несколько прайс-листов и объединяет товары в порядке файлов.
+    - Каждый файл разбирается отдельно: свой разделитель и свой текущий бренд.
+    - При `workers` > 1 файлы разбираются в нескольких процессах, а единственный файл — по частям.
+    - Файл с ошибкой пропускается, остальные обрабатываются.
+    Возвращает (товары, [(файл, ошибка)]).
+    """
+    if workers > 1 and len(paths) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths)), initializer=init_worker_stats,
+                                 initargs=(STATS.enabled,)) as executor:
+            loaded = []
+            for products, error, counters in executor.map(_load_supplier_file_in_worker, paths,
+                                                          [store_color_synonyms] * len(paths)):
+                STATS.merge_counters(counters)
+                loaded.append((products, error))
+    else:
+        loaded = [_load_supplier_file(path, store_color_synonyms, workers) for path in paths]
+
+    supplier_products: list[SupplierProduct] = []
+    errors: list[tuple[Path, str]] = []
+    for path, (products, error) in zip(paths, loaded):
+        if error is not None:
+            errors.append((path, error))
+        supplier_products.extend(products)
+    STATS.count("supplier_files", len(paths))
+    STATS.count("supplier_files_failed", len(errors))
+    return supplier_products, errors
+
+def iter_supplier_files(paths: list[Path], store_color_synonyms: dict[str, set[str]],
+                        errors: list[tuple[Path, str]]) -> Iterator[tuple[int, SupplierProduct]]:
+    """
+    Потоковый вариант `load_supplier_files`: файлы читаются по очереди, товары выдаются по одному
+    вместе с номером файла в `paths`.
+    Ошибки добавляются в `errors`. Товары, выданные из файла до ошибки, уже не вернуть, поэтому
+    вызывающий, как и `load_supplier_files`, отбрасывает файл с ошибкой целиком по его номеру.
+    """
+    for file_number, path in enumerate(paths):
+        try:
+            for supplier_product in iter_supplier_products(path, store_color_synonyms):
+                yield file_number, supplier_product
+        except FILE_ERRORS as error:
+            errors.append((path, f"{type(error).__name__}: {error}"))
+    STATS.count("supplier_files", len(paths))
+    STATS.count("supplier_files_failed", len(errors))
+    STATS.count("supplier_files", len(paths))
+    STATS.count("supplier_files_failed", len(errors))
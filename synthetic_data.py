@@ -0,0 +1,150 @@
+import argparse
+import csv
+import random
+from pathlib import Path
+
+# Бренды и модели в том виде, как они приходят в каталоге магазина
+CATALOG = {
+    "Samsung": ["Galaxy S24", "Galaxy S24 Ultra", "Galaxy S24 FE", "Galaxy A55", "Galaxy A35", "Galaxy A15",
+                "Galaxy Z Flip6", "Galaxy Z Fold6", "Galaxy Tab S9"],
+    "Xiaomi": ["Redmi Note 13", "Redmi Note 13 Pro", "Redmi Note 13 Pro+", "Poco X6 Pro", "Poco F6", "14 Ultra",
+               "Redmi 13C", "13T Pro"],
+    "Apple": ["iPhone 15", "iPhone 15 Pro", "iPhone 15 Pro Max", "iPhone 16", "iPhone 16 Pro", "iPad Air 11"],
+    "Google": ["Pixel 8", "Pixel 8 Pro", "Pixel 8a", "Pixel 9", "Pixel 9 Pro XL", "Pixel 7a"],
+    "Honor": ["Magic 6 Pro", "X8b", "200 Pro", "90 Lite"],
+    "Huawei": ["Pura 70", "Nova 12", "Mate 60 Pro"],
+    "Realme": ["12 Pro+", "C67", "GT 6", "Narzo 70"],
+    "Tecno": ["Camon 30", "Spark 20 Pro", "Pova 6 Pro"],
+    "Infinix": ["Hot 40i", "Note 40 Pro", "Zero 30"],
+    "OnePlus": ["12", "12R", "Nord 4"],
+    "Nothing": ["Phone (2a)", "Phone (2)"],
+    "Vivo": ["V30", "Y36", "X100 Pro"],
+}
+
+# (русский цвет, английский цвет): русский идет в `Цвет` и `Наименование`, английский — в скобки
+COLORS = [("Черный", "Black"), ("Серебристый", "Silver"), ("Синий", "Blue"), ("Зеленый", "Green"),
+          ("Фиолетовый", "Purple"), ("Серый", "Gray"), ("Белый", "White"), ("Золотой", "Gold"),
+          ("Графитовый", "Graphite"), ("Голубой", "Light Blue"), ("Титановый", "Titanium Gray")]
+
+MEMORY = [(4, 64), (4, 128), (6, 128), (8, 128), (8, 256), (12, 256), (12, 512), (16, 512), (16, 1024)]
+
+SUPPLIERS = [f"Поставщик {i}" for i in range(1, 31)]
+
+EMOJI = ["", "", "", "🔥", "✅ ", "⚡️", "🇺🇸 ", "🇪🇺", "(новинка) "]
+
+STORE_HEADER = ["Наименование", "Модель", "Производитель", "Цвет", "Оперативная память (Gb)",
+                "Встроенная память", "Внешний код"]
+
+def store_storage(storage: int) -> str:
+    return "1 ТБ" if storage == 1024 else f"{storage} ГБ"
+
+def generate_store_rows(size: int, seed: int = 0) -> list[tuple[str, str, int, int, str, str, list[str]]]:
+    """
+    Генерирует товары магазина детерминированно по `seed`.
+    Возвращает (бренд, модель, RAM, Storage, русский цвет, английский цвет, строка CSV).
+    """
+    rnd = random.Random(seed)
+    rows = []
+    for idx in range(size):
+        brand = rnd.choice(list(CATALOG))
+        model = rnd.choice(CATALOG[brand])
+        ram, storage = rnd.choice(MEMORY)
+        russian_color, english_color = rnd.choice(COLORS)
+
+        name = f"Смартфон {brand} {model} {ram}/{store_storage(storage)} {russian_color}"
+        if rnd.random() < 0.7:
+            name += f" ({english_color})"
+        color_column = russian_color if rnd.random() < 0.9 else ""
+        ram_column = str(ram) if rnd.random() < 0.9 else ""
+
+        row = [name, model, brand, color_column, ram_column, store_storage(storage), f"SKU{idx:07d}"]
+        rows.append((brand, model, ram, storage, russian_color, english_color, row))
+    return rows
+
+def supplier_memory(rnd: random.Random, ram: int, storage: int) -> str:
+    """Все варианты записи памяти, которые разбирает `extract_memory`, и немного без RAM."""
+    if storage == 1024:
+        return rnd.choice([f"{ram}/1TB", f"{ram}/1024GB", f"{ram}+1024gb"])
+    return rnd.choice([f"{ram}/{storage}GB", f"{ram}/{storage}gb", f"{ram}+{storage}GB", f"{ram} {storage}",
+                       f"{ram}/{storage}", f"{ram} / {storage}Gb", f"{ram}\\{storage}", f"{storage}GB"])
+
+def generate_supplier_row_texts(store_rows: list, size: int, seed: int = 0):
+    """
+    Генерирует строки прайс-листа поставщиков по товарам магазина.
+    - Заголовки брендов вида "📱SAMSUNG📱", после которых бренд в строках часто опущен.
+    - Эмодзи и пометки вокруг названия, цвет на английском или русском, разные форматы памяти.
+    - Немного мусора: строки без цены и строки с "[".
+    """
+    rnd = random.Random(seed + 1)
+    by_brand: dict[str, list] = {}
+    for store_row in store_rows:
+        by_brand.setdefault(store_row[0], []).append(store_row)
+    brands = list(by_brand)
+
+    current_brand = rnd.choice(brands)
+    produced = 0
+    while produced < size:
+        if rnd.random() < 0.02:
+            current_brand = rnd.choice(brands)
+            yield [f"📱{current_brand.upper()}📱", ""]
+            continue
+
+        roll = rnd.random()
+        if roll < 0.02:
+            yield [f"{rnd.choice(EMOJI)}Уточняйте наличие у менеджера", rnd.choice(SUPPLIERS)]
+            produced += 1
+            continue
+        if roll < 0.03:
+            yield [f"[уценка] {current_brand} {rnd.choice(CATALOG[current_brand])} {rnd.randint(9000, 99999)}",
+                   rnd.choice(SUPPLIERS)]
+            produced += 1
+            continue
+
+        brand, model, ram, storage, russian_color, english_color, _ = rnd.choice(by_brand[current_brand])
+        if rnd.random() < 0.15:
+            model += rnd.choice([" 5G", " NFC", " Dual Sim", " LTE"])
+        brand_prefix = brand if rnd.random() < 0.4 else ""
+        color = rnd.choice([english_color, english_color.lower(), russian_color.lower(), ""])
+        price = rnd.randint(9_000, 250_000)
+        price_text = rnd.choice([f"{price}", f"{price}₽", f"{price} ₽", f"{price}$"])
+        text = f"{rnd.choice(EMOJI)}{brand_prefix} {model} {supplier_memory(rnd, ram, storage)} {color} {price_text}"
+        yield [" ".join(text.split()), rnd.choice(SUPPLIERS)]
+        produced += 1
+
+def write_store_csv(path: Path, size: int, seed: int = 0) -> list:
+    """Пишет CSV магазина и возвращает сгенерированные товары (для генерации поставщиков)."""
+    store_rows = generate_store_rows(size, seed)
+    with open(path, "w", encoding="utf-8", newline="") as fp:
+        writer = csv.writer(fp, delimiter=";")
+        writer.writerow(STORE_HEADER)
+        writer.writerows(store_row[-1] for store_row in store_rows)
+    return store_rows
+
+def write_supplier_csv(path: Path, store_rows: list, size: int, seed: int = 0) -> None:
+    """Пишет прайс-лист поставщиков построчно, подходит и для миллионов строк."""
+    with open(path, "w", encoding="utf-8", newline="") as fp:
+        writer = csv.writer(fp, delimiter=";")
+        writer.writerows(generate_supplier_row_texts(store_rows, size, seed))
+
+def generate_dataset(directory: Path, store_size: int, supplier_size: int, seed: int = 0) -> tuple[Path, Path]:
+    """Генерирует пару файлов `store_<N>.csv` и `supplier_<M>.csv` в папке, возвращает их пути."""
+    directory.mkdir(parents=True, exist_ok=True)
+    store_path = directory / f"store_{store_size}_{seed}.csv"
+    supplier_path = directory / f"supplier_{supplier_size}_{store_size}_{seed}.csv"
+    store_rows = write_store_csv(store_path, store_size, seed)
+    write_supplier_csv(supplier_path, store_rows, supplier_size, seed)
+    return store_path, supplier_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетических CSV магазина и поставщиков")
+    parser.add_argument("directory", type=Path, help="Папка для файлов")
+    parser.add_argument("--store-size", type=int, default=5000, help="Количество товаров магазина")
+    parser.add_argument("--supplier-size", type=int, default=10000, help="Количество строк поставщиков")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    store_path, supplier_path = generate_dataset(args.directory, args.store_size, args.supplier_size, args.seed)
+    print(f"✅ {store_path}\n✅ {supplier_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+from typing import Callable
+
+import numpy as np
+
+from instrumentation import STATS
+from matcher import calculate_match_score, calculate_similarity
+from store_processing import StoreProduct
+from supplier_processing import SupplierProduct
+
+# Сколько ячеек (товары поставщика × товары магазина) считается за один раз
+BATCH_CELLS = 2_000_000
+
+class VectorEngine:
+    """
+    Каталог магазина в виде массивов NumPy для пакетного подсчета баллов.
+    - Бренд, модель и цвет закодированы целыми номерами, RAM и Storage — числами (0, если не указаны).
+    - Ключевые слова хранятся как разреженная матрица инцидентности в формате CSR
+      (номер слова -> номера товаров), общее число слов для пачки товаров поставщика
+      считается одним `np.bincount` по всем парам (строка пачки, товар магазина).
+    - Все слагаемые баллов, кроме схожести моделей, считаются одним выражением для всей пачки.
+      Для товаров своего бренда получается верхняя граница (схожесть 100 / 5),
+      для остальных — точные баллы.
+    - Схожесть моделей считается только для товаров, чья граница может превзойти лучшие баллы,
+      в порядке убывания границы, как в `find_best_match`. Результат совпадает с полным перебором.
+    """
+    def __init__(self, store_products: list[StoreProduct]) -> None:
+        self.store_products = store_products
+        self.size = len(store_products)
+
+        self.brand_codes: dict[str | None, int] = {}
+        self.model_codes: dict[str | None, int] = {}
+        self.color_codes: dict[str | None, int] = {}
+        self.brands = np.array([self.brand_codes.setdefault(p.brand, len(self.brand_codes)) for p in store_products],
+                               dtype=np.int64)
+        self.models = np.array([self.model_codes.setdefault(p.model, len(self.model_codes)) for p in store_products],
+                               dtype=np.int64)
+        self.colors = np.array([self.color_codes.setdefault(p.color, len(self.color_codes)) if p.color else -1
+                                for p in store_products], dtype=np.int64)
+        self.rams = np.array([p.ram or 0 for p in store_products], dtype=np.int64)
+        self.storages = np.array([p.storage or 0 for p in store_products], dtype=np.int64)
+
+        # CSR: товары со словом k — indices[indptr[k]:indptr[k + 1]]
+        keyword_ids = np.concatenate([np.frombuffer(p.keyword_ids, dtype=p.keyword_ids.typecode) for p in store_products]
+                                     or [np.empty(0, dtype=np.uint32)]).astype(np.int64)
+        # Слова с большими номерами нет ни у одного товара каталога, поэтому словарь процесса не нужен
+        self.keyword_count = int(keyword_ids.max()) + 1 if keyword_ids.size else 0
+        owners = np.repeat(np.arange(self.size, dtype=np.int64), [len(p.keyword_ids) for p in store_products])
+        order = np.argsort(keyword_ids, kind="stable")
+        self.indices = owners[order]
+        self.indptr = np.zeros(self.keyword_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keyword_ids, minlength=self.keyword_count), out=self.indptr[1:])
+
+    def overlap_counts(self, supplier_products: list[SupplierProduct]) -> np.ndarray:
+        """Матрица (товары поставщика × товары магазина) с числом общих ключевых слов."""
+        rows, store_ids = [], []
+        for row, supplier_product in enumerate(supplier_products):
+            for keyword_id in supplier_product.keyword_ids:
+                # Слова, которых нет в каталоге (появились после построения), ни с чем не совпадают
+                if keyword_id < self.keyword_count:
+                    start, end = self.indptr[keyword_id], self.indptr[keyword_id + 1]
+                    if start < end:
+                        store_ids.append(self.indices[start:end])
+                        rows.append(np.full(end - start, row, dtype=np.int64))
+        cells = len(supplier_products) * self.size
+        if not store_ids:
+            return np.zeros((len(supplier_products), self.size), dtype=np.int64)
+        flat = np.concatenate(rows) * self.size + np.concatenate(store_ids)
+        return np.bincount(flat, minlength=cells).reshape(len(supplier_products), self.size)
+
+    @staticmethod
+    def _codes(values: list, codes: dict[str | None, int]) -> np.ndarray:
+        """Номера значений товаров поставщика столбцом; значения, которых нет в каталоге, получают -2."""
+        return np.array([codes.get(value, -2) for value in values], dtype=np.int64)[:, None]
+
+    def score_bounds(self, supplier_products: list[SupplierProduct]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Возвращает (число общих слов, баллы без схожести моделей, признак своего бренда) для пачки.
+        Для своего бренда баллы — верхняя граница с максимальной схожестью, для чужого — точные баллы.
+        Все слагаемые кратны 0.5, поэтому float-значения точные.
+        """
+        common_keywords = self.overlap_counts(supplier_products)
+        same_brand = self.brands[None, :] == self._codes([p.brand for p in supplier_products], self.brand_codes)
+        same_model = self.models[None, :] == self._codes([p.model for p in supplier_products], self.model_codes)
+        # Цвет, как и RAM со Storage, дает баллы, только если указан у товара поставщика
+        same_color = self.colors[None, :] == self._codes([p.color or None for p in supplier_products],
+                                                         self.color_codes)
+        rams = np.array([p.ram or -1 for p in supplier_products], dtype=np.int64)[:, None]
+        storages = np.array([p.storage or -1 for p in supplier_products], dtype=np.int64)[:, None]
+
+        scores = common_keywords * 1.5
+        scores += 30 * same_model
+        scores += np.where(same_brand, 40, -50)  # 20 за бренд и не больше 100 / 5 за схожесть
+        scores += 15 * (self.rams[None, :] == rams)
+        scores += 15 * (self.storages[None, :] == storages)
+        scores += 3 * same_color
+        return common_keywords, scores, same_brand
+
+    def find_match(self, supplier_product: SupplierProduct, common_keywords: np.ndarray, bounds: np.ndarray,
+                   same_brand: np.ndarray, similarity: Callable[[str, str], float]) -> tuple[int | None, float]:
+        """Лучший товар для одной строки пачки: точные баллы чужих брендов и схожесть только для выживших."""
+        other_scores = np.where(same_brand, -np.inf, bounds)
+        best_id = int(np.argmax(other_scores))  # Первый из равных, как в полном переборе
+        best_score = float(other_scores[best_id])
+        if best_score <= 0:
+            best_id, best_score = None, 0
+
+        survivors = np.flatnonzero(same_brand & (bounds >= best_score))
+        order = survivors[np.lexsort((survivors, -bounds[survivors]))]
+        evaluated = 0
+        for idx in order.tolist():
+            bound = float(bounds[idx])
+            if bound < best_score:
+                break
+            if bound == best_score and (best_id is None or idx > best_id):
+                continue
+            score = calculate_match_score(supplier_product, self.store_products[idx], int(common_keywords[idx]),
+                                          similarity)
+            evaluated += 1
+            if score > best_score or (best_id is not None and score == best_score and idx < best_id):
+                best_id, best_score = idx, score
+        STATS.count("pairs_fully_scored", evaluated)
+        return best_id, best_score
+
+    def match(self, supplier_products: list[SupplierProduct],
+              similarity_for: Callable[[SupplierProduct], Callable[[str, str], float]] = lambda _: calculate_similarity
+              ) -> list[tuple[int | None, float]]:
+        """Возвращает (номер товара магазина или None, баллы) для каждого товара поставщика по порядку."""
+        batch_size = max(1, BATCH_CELLS // max(1, self.size))
+        results: list[tuple[int | None, float]] = []
+        for start in range(0, len(supplier_products), batch_size):
+            batch = supplier_products[start:start + batch_size]
+            common_keywords, bounds, same_brand = self.score_bounds(batch)
+            STATS.count("pairs_scored", bounds.size)
+            for row, supplier_product in enumerate(batch):
+                results.append(self.find_match(supplier_product, common_keywords[row], bounds[row], same_brand[row],
+                                               similarity_for(supplier_product)))
+        return results